@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Ingestion Benchmark
+Compares per-row save_event calls with one save_events batch per cycle.
+
+Run from the project root:
+    python3 benchmarks/bench_ingest.py [cycles] [events_per_cycle]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+config.DB_FILE = os.path.join(tempfile.mkdtemp(prefix='bench_ingest_'), 'bench.db')
+
+import database.database_operations as db  # noqa: E402
+import duplicate_checker  # noqa: E402
+
+
+def make_cycle(cycle, size):
+    batch = []
+    for i in range(size):
+        details = f'command {cycle} {i}'
+        batch.append({'event_type': 'bash_command', 'details': details,
+                      'hash': duplicate_checker.make_hash('bash_command', details)})
+    return batch
+
+
+def run_per_row(cycles, size):
+    start = time.perf_counter()
+    for c in range(cycles):
+        for ev in make_cycle(c, size):
+            db.save_event(ev['event_type'], ev['details'], hash_value=ev['hash'])
+    return time.perf_counter() - start
+
+
+def run_batched(cycles, size):
+    start = time.perf_counter()
+    for c in range(cycles):
+        db.save_events(make_cycle(cycles + c, size))
+    return time.perf_counter() - start
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    total = cycles * size
+
+    db.create_database()
+    per_row = run_per_row(cycles, size)
+    batched = run_batched(cycles, size)
+
+    print(f'{total} events in {cycles} cycles of {size}')
+    print(f'per-row save_event : {per_row:.3f}s  ({total / per_row:,.0f} events/s)')
+    print(f'batched save_events: {batched:.3f}s  ({total / batched:,.0f} events/s)')
+    print(f'speedup: {per_row / batched:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
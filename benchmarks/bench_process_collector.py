@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Process Collector Benchmark
+Compares the old `ps aux` subprocess path with the /proc top-N collector
+and the incremental ProcessLeaderboard tick.
+
+Run from the project root:
+    python3 benchmarks/bench_process_collector.py [rounds] [spawn] [top_n]
+
+`spawn` starts that many idle `sleep` processes first, to measure on a
+host with thousands of processes.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collectors_mainpulations.process_collector as proc_collector  # noqa: E402
+import system_resources_monitor as srm  # noqa: E402
+
+
+def ps_processes(max_processes=5):
+    """The previous implementation: fork `ps aux`, keep the first N lines."""
+    output = subprocess.check_output(['ps', 'aux'], text=True)
+    lines = output.strip().split('\n')[1:]
+    processes = []
+    for line in lines[:max_processes]:
+        parts = line.split(None, 10)
+        if len(parts) >= 11:
+            processes.append({'user': parts[0], 'cpu': parts[2], 'mem': parts[3], 'command': parts[10]})
+    return processes
+
+
+def ps_sorted(max_processes=5):
+    """`ps` doing the real top-N itself, for a fair comparison."""
+    output = subprocess.check_output(['ps', 'aux', '--sort=-pcpu'], text=True)
+    return output.strip().split('\n')[1:max_processes + 1]
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    spawn = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    top_n = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    children = [subprocess.Popen(['sleep', '600']) for _ in range(spawn)]
+    try:
+        count = sum(1 for e in os.scandir('/proc') if e.name.isdigit())
+        print(f'{count} processes, {rounds} rounds, top {top_n}')
+        board = srm.ProcessLeaderboard(top_n=top_n)
+        # warm up: first ticks read every process and open the handles
+        for _ in range(board.idle_every + 2):
+            board.tick()
+        results = [
+            ('ps aux, first N lines', lambda: ps_processes(top_n)),
+            ('ps aux --sort=-pcpu', lambda: ps_sorted(top_n)),
+            ('/proc scan + heap (cpu, rss)', lambda: proc_collector.top_processes(top_n)),
+            ('leaderboard tick (incremental)', board.tick),
+        ]
+        baseline = None
+        for name, fn in results:
+            t = timed(fn, rounds)
+            baseline = baseline or t
+            print(f'{name:30}: {t * 1000:8.2f} ms/cycle  ({baseline / t:.1f}x)')
+    finally:
+        for c in children:
+            c.kill()
+            c.wait()
+
+
+if __name__ == '__main__':
+    main()
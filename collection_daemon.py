@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Collection Daemon
+Runs the collectors without the GUI: `python3 main.py --daemon`
+
+CollectionService owns everything that writes to the database: the
+write-behind queue, the scheduled collectors, the event-driven process and
+file capture, retention, the rollup refresh and the resource metrics. The
+daemon runs it in the foreground (meant for systemd, nohup or a container)
+with a PID file, at config.DAEMON_NICE, and on SIGTERM/SIGINT stops the
+collectors and flushes the queue before exiting. While a daemon is running
+the dashboard starts none of this and only reads the database.
+"""
+
+import os
+import signal
+import threading
+
+import config
+import database.database_operations as db
+from auto_updater import AutoUpdater
+from database import metrics_store
+from database import retention
+from database import rollups
+from database import write_behind
+import collectors_mainpulations.cgroup_collector as cgroup_collector
+import collectors_mainpulations.collector_registry as collector_registry
+import collectors_mainpulations.inotify_watcher as inotify_watcher
+import collectors_mainpulations.proc_connector as proc_connector
+import resource_sampler
+
+
+def pid_file_path():
+    if config.DAEMON_PID_FILE:
+        return os.path.expanduser(config.DAEMON_PID_FILE)
+    # next to the database by default (the inotify watcher ignores DB_FILE*)
+    return os.path.abspath(config.DB_FILE) + '.daemon.pid'
+
+
+def running_pid(path=None):
+    """PID of the running daemon according to its PID file, or None."""
+    try:
+        with open(path or pid_file_path()) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+    except PermissionError:
+        # alive, but another user's
+        return pid
+    except (OSError, ValueError):
+        return None
+    return pid
+
+
+def write_pid_file(path=None):
+    """Create the PID file; raises RuntimeError if another daemon is alive."""
+    path = path or pid_file_path()
+    other = running_pid(path)
+    if other and other != os.getpid():
+        raise RuntimeError(f"collection daemon already running (pid {other}, {path})")
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(f'{os.getpid()}\n')
+    os.replace(tmp, path)
+    return path
+
+
+def remove_pid_file(path=None):
+    path = path or pid_file_path()
+    if running_pid(path) == os.getpid():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CollectionService:
+    def __init__(self, writer=None):
+        self.writer = writer or write_behind.get_queue()
+        self.retention = None
+        self.rollups = None
+        self.proc_events = None
+        self.file_watcher = None
+        self.collectors = None
+        self.metrics = None
+        self.metrics_flusher = None
+        self.cgroups = None
+
+    def start(self, schedule=True):
+        """Start capture, retention and rollups; with `schedule` also the collector scheduler."""
+        # old events are pruned in the background, not on every insert
+        self.retention = retention.start_scheduler()
+        # every exec/exit as it happens, replaces the periodic process tracker
+        self.proc_events = proc_connector.start(self.writer.submit) if config.PROC_EVENTS_ENABLED else None
+        # file changes as they happen, replaces the periodic open-file scan
+        self.file_watcher = inotify_watcher.start(self.writer.submit) if config.FILE_WATCH_ENABLED else None
+        collector_registry.register_builtin()
+        skip = [name for name, replaced in (('processes', self.proc_events), ('open_files', self.file_watcher)) if replaced]
+        self.collectors = collector_registry.CollectorScheduler(self.writer.submit, collector_registry.registered(skip))
+        # resource samples are persisted in the tiered metrics store
+        self.metrics = metrics_store.MetricsRecorder()
+        resource_sampler.get_sampler().add_listener(self.metrics.add)
+        self.metrics_flusher = AutoUpdater(config.METRICS_FLUSH_SECONDS, self.metrics.flush)
+        self.metrics_flusher.start()
+        # per-service/container series go to the same store
+        self.cgroups = cgroup_collector.start(self.metrics.add) if config.CGROUP_ENABLED else None
+        # keep the rollups current so readers don't fold events in themselves
+        self.rollups = AutoUpdater(config.ROLLUP_REFRESH_SECONDS, rollups.refresh)
+        self.rollups.start()
+        if schedule:
+            self.collectors.start()
+
+    def request_flush(self, callback=None):
+        """Flush the queue and fold the new events into the rollups on the writer thread, then run `callback`."""
+        def flushed():
+            rollups.refresh()
+            if callback:
+                callback()
+        self.writer.request_flush(flushed)
+
+    def stop(self, timeout=10):
+        """Stop collecting (waiting up to `timeout` for running collectors) and flush the queue."""
+        if self.collectors:
+            self.collectors.stop(timeout=timeout)
+            self.collectors.shutdown()
+        for part in (self.proc_events, self.file_watcher, self.rollups, self.retention, self.cgroups,
+                     self.metrics_flusher):
+            if part:
+                part.stop()
+        if self.metrics:
+            self.metrics.flush(final=True)
+        self.writer.stop()
+
+
+def run(pid_file=None):
+    """Run the collection service until SIGTERM/SIGINT; returns the exit status."""
+    db.create_database()
+    try:
+        pid_file = write_pid_file(pid_file)
+    except (RuntimeError, OSError) as e:
+        print(f"Daemon error: {e}")
+        return 1
+    try:
+        if config.DAEMON_NICE:
+            os.nice(config.DAEMON_NICE)
+        stopping = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: stopping.set())
+        service = CollectionService()
+        service.start()
+        print(f"Collection daemon running (pid {os.getpid()}, {len(service.collectors.collectors)} collectors)")
+        while not stopping.wait(config.DAEMON_STATS_SECONDS or None):
+            for name, s in service.collectors.stats().items():
+                print(f"{name}: {s['runs']} runs, {s['events']} events, avg {s['avg_ms']:.1f} ms, "
+                      f"{s['errors']} errors, {s['timeouts']} timeouts")
+        print("Collection daemon stopping")
+        service.stop()
+    finally:
+        remove_pid_file(pid_file)
+    return 0
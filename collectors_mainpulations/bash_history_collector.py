@@ -2,38 +2,137 @@
 """
 Bash History Collector
 Collects bash commands only
+
+The history file is tailed: only bytes appended since the last cycle are
+read, using the cursor (inode, size, offset) stored in the database. A
+truncated, rewritten or rotated file is detected and resumed after the last
+command already seen. `#<epoch>` lines written with HISTTIMEFORMAT set give
+each command its real execution time.
 """
 
 import os
+import re
+
 import duplicate_checker
+from collectors_mainpulations import file_tail
+from database import collector_cursors
+
+
+_TIMESTAMP = re.compile(rb'^#(\d{9,11})$')
+
+
+def history_path():
+    return os.path.join(os.path.expanduser("~"), ".bash_history")
 
 
 def get_bash_commands(max_commands=50):
     """Get bash command history"""
     try:
-        home = os.path.expanduser("~")
-        history_file = os.path.join(home, ".bash_history")
-        
+        history_file = history_path()
+
         if not os.path.exists(history_file):
             return []
-        
+
         with open(history_file, 'r', encoding='utf-8', errors='ignore') as f:
-            commands = [line.strip() for line in f if line.strip()]
-        
+            commands = [line.strip() for line in f
+                        if line.strip() and not _TIMESTAMP.match(line.strip().encode())]
+
         return commands[-max_commands:]
     except:
         return []
 
 
-def collect_and_save(db_save_function, limit=10):
-    """Collect bash commands and save to database"""
-    commands = get_bash_commands()
-    
-    for cmd in commands[-limit:]:
+def parse_history(data):
+    """Parse complete history lines into a list of (command, epoch or None, offset in data).
+
+    The offset is where the record starts, at its `#<epoch>` line if it has one.
+    """
+    commands = []
+    ts = None
+    pos = 0
+    for raw in data.split(b'\n'):
+        start, pos = pos, pos + len(raw) + 1
+        line = raw.strip()
+        if not line:
+            continue
+        m = _TIMESTAMP.match(line)
+        if m:
+            ts, ts_start = int(m.group(1)), start
+            continue
+        commands.append((line.decode('utf-8', 'ignore'), ts, start if ts is None else ts_start))
+        ts = None
+    return commands
+
+
+def complete_records(data):
+    """Length of the whole lines in `data`; a trailing timestamp waits for its command."""
+    end = data.rfind(b'\n') + 1
+    lines = data[:end].split(b'\n')[:-1]
+    while lines and _TIMESTAMP.match(lines[-1].strip()):
+        end -= len(lines.pop()) + 1
+    return end
+
+
+def command_hash(path, offset, cmd):
+    """Duplicate-check hash of the history record at byte `offset` of `path`.
+
+    A repeated command sits at another offset and hashes differently, so only
+    a re-read of the same bytes (after a lost cursor) is skipped.
+    """
+    return duplicate_checker.make_hash('bash_command', f'{path}:{offset}|{cmd}')
+
+
+def read_new_commands(path=None, first_run_limit=50):
+    """Return (commands, cursor) with the commands appended since the stored cursor.
+
+    `commands` is a list of (command, epoch or None, file offset). Without a usable
+    cursor (first run, or the old position is gone) only the last
+    `first_run_limit` commands of the file are returned. Save `cursor`
+    with collector_cursors.save once the commands are handed off.
+    """
+    path = path or history_path()
+    name = f'bash_history:{path}'
+    state = collector_cursors.load(name)
+    try:
+        data, cursor, resumed = file_tail.read_new(path, state, complete_records)
+    except OSError:
+        return [], None
+
+    start = cursor[2] - len(data)
+    commands = [(cmd, ts, start + pos) for cmd, ts, pos in parse_history(data)]
+    if not resumed:
+        commands = commands[-first_run_limit:]
+    return commands, (name,) + cursor
+
+
+def collect_and_save(db_save_events, limit=10):
+    """Collect commands appended since the last cycle and save them as one batch
+
+    `db_save_events` returns (accepted, dropped) like WriteBehindQueue.submit;
+    the cursor only moves past the accepted commands.
+    """
+    try:
+        commands, cursor = read_new_commands(first_run_limit=limit)
+    except Exception:
+        return 0
+
+    path = history_path()
+    batch = []
+    for cmd, ts, offset in commands:
+        # a lost cursor re-reads the last commands; the hash keeps them out
+        event = {'event_type': 'bash_command', 'details': cmd, 'hash': command_hash(path, offset, cmd)}
+        if ts is not None:
+            event['ts'] = ts
+        batch.append(event)
+    accepted = len(batch)
+    if batch:
+        accepted, _ = db_save_events(batch)
+    if cursor:
+        offsets = [offset for _, _, offset in commands]
         try:
-            h = duplicate_checker.make_hash('bash_command', cmd)
-            db_save_function('bash_command', cmd, hash_value=h)
-        except Exception:
-            db_save_function('bash_command', cmd)
-    
-    return len(commands[-limit:])
+            collector_cursors.save(cursor[0], *file_tail.handed_off(path, cursor[1:], offsets, accepted))
+        except OSError:
+            # can't place it: keep the old cursor, the commands come again
+            pass
+
+    return accepted
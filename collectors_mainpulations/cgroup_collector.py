@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Cgroup Collector
+Per-cgroup CPU, memory and disk I/O from the cgroup v2 hierarchy
+
+Every config.CGROUP_INTERVAL_SECONDS each cgroup down to
+config.CGROUP_MAX_DEPTH (systemd services, user sessions, containers) has
+its cpu.stat, memory.current and io.stat read once; CPU and I/O become
+rates from the difference to the previous read. The cgroup tree is cached:
+a directory is only listed again when its mtime changed, with a full
+rescan every config.CGROUP_RESCAN_SECONDS in case a change left no trace.
+The series go to the metrics store next to the host metrics, named
+'cgroup.<path>.cpu' (percent of one CPU), '.memory' (bytes), '.io_read' /
+'.io_write' (bytes/s) and '.iops'.
+"""
+
+import os
+import time
+
+import config
+from auto_updater import AutoUpdater
+from system_resources_monitor import counter_delta
+
+
+def find_root():
+    """Mount point of the cgroup v2 hierarchy, or None."""
+    try:
+        with open('/proc/self/mountinfo') as f:
+            for line in f:
+                mount, _, fs = line.partition(' - ')
+                if fs.split()[:1] == ['cgroup2']:
+                    return mount.split()[4]
+    except OSError:
+        pass
+    return None
+
+
+def _read(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return os.read(fd, 65536)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+
+
+_IO_KEYS = {b'rbytes': 0, b'wbytes': 1, b'rios': 2, b'wios': 3}
+
+
+def read_counters(path):
+    """(cpu usec, memory bytes, read bytes, written bytes, read ios, write ios) of one cgroup.
+
+    Values of controllers not enabled for the cgroup are None.
+    """
+    usage = memory = None
+    io = [None] * 4
+    data = _read(os.path.join(path, 'cpu.stat'))
+    if data:
+        for line in data.splitlines():
+            if line.startswith(b'usage_usec '):
+                usage = int(line.split()[1])
+                break
+    data = _read(os.path.join(path, 'memory.current'))
+    if data:
+        memory = int(data)
+    data = _read(os.path.join(path, 'io.stat'))
+    if data is not None:
+        # one line per device: "8:0 rbytes=.. wbytes=.. rios=.. wios=.. dbytes=.. dios=.."
+        io = [0, 0, 0, 0]
+        for line in data.splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition(b'=')
+                index = _IO_KEYS.get(key)
+                if index is not None:
+                    io[index] += int(value)
+    return (usage, memory) + tuple(io)
+
+
+class CgroupTree:
+    """Cached cgroup directories; `refresh()` lists only those whose mtime changed."""
+
+    def __init__(self, root, max_depth):
+        self.root = root
+        self.max_depth = max_depth
+        self._dirs = {}  # path -> [mtime_ns, child names]
+
+    def refresh(self, full=False):
+        """Walk the cached tree; returns True if cgroups appeared or went away."""
+        dirs = {}
+        changed = False
+        stack = [(self.root, 0)]
+        while stack:
+            path, depth = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                changed = True
+                continue
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime and not full:
+                children = cached[1]
+            else:
+                try:
+                    with os.scandir(path) as it:
+                        children = sorted(e.name for e in it if e.is_dir(follow_symlinks=False))
+                except OSError:
+                    changed = True
+                    continue
+                changed = changed or cached is None or cached[1] != children
+            dirs[path] = [mtime, children]
+            if depth < self.max_depth:
+                stack.extend((os.path.join(path, c), depth + 1) for c in children)
+        changed = changed or dirs.keys() != self._dirs.keys()
+        self._dirs = dirs
+        return changed
+
+    def cgroups(self):
+        """Every cached cgroup below the root."""
+        return [p for p in self._dirs if p != self.root]
+
+
+class CgroupCollector:
+    def __init__(self, root=None, max_depth=None):
+        self.root = root or config.CGROUP_ROOT or find_root()
+        self.tree = CgroupTree(self.root, max_depth or config.CGROUP_MAX_DEPTH) if self.root else None
+        self.latest = {}
+        self._prev = {}       # path -> (monotonic, counters)
+        self._last_full = None
+
+    def sample(self):
+        """Read every cgroup once; returns {metric: value}, rates since the previous call."""
+        if self.tree is None:
+            return {}
+        now = time.monotonic()
+        full = self._last_full is None or now - self._last_full >= config.CGROUP_RESCAN_SECONDS
+        if full:
+            self._last_full = now
+        self.tree.refresh(full)
+
+        values = {}
+        # cgroups that went away drop out of _prev here
+        prev, self._prev = self._prev, {}
+        for path in self.tree.cgroups():
+            counters = read_counters(path)
+            self._prev[path] = (now, counters)
+            name = 'cgroup.' + os.path.relpath(path, self.root)
+            usage, memory, rbytes = counters[:3]
+            if memory is not None:
+                values[f'{name}.memory'] = memory
+            old = prev.get(path)
+            if old is None or now <= old[0]:
+                continue
+            elapsed = now - old[0]
+            if usage is not None and old[1][0] is not None:
+                delta = counter_delta(usage, old[1][0])
+                if delta is not None:
+                    values[f'{name}.cpu'] = 100.0 * delta / (elapsed * 1e6)
+            if rbytes is not None and old[1][2] is not None:
+                deltas = [counter_delta(c, o) for c, o in zip(counters[2:], old[1][2:])]
+                if None not in deltas:
+                    values[f'{name}.io_read'] = deltas[0] / elapsed
+                    values[f'{name}.io_write'] = deltas[1] / elapsed
+                    values[f'{name}.iops'] = (deltas[2] + deltas[3]) / elapsed
+        self.latest = values
+        return values
+
+
+def start(record):
+    """Sample the cgroups every config.CGROUP_INTERVAL_SECONDS into `record(ts, values)`.
+
+    Returns the running AutoUpdater, or None when there is no cgroup v2 hierarchy.
+    """
+    collector = CgroupCollector()
+    if collector.tree is None:
+        return None
+
+    def poll():
+        try:
+            values = collector.sample()
+            if values:
+                record(time.time(), values)
+        except Exception as e:
+            print(f"Cgroup collector error: {e}")
+
+    updater = AutoUpdater(config.CGROUP_INTERVAL_SECONDS, poll)
+    updater.start()
+    return updater
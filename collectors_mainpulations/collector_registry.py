@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Collector Registry
+Collectors declare how often they run, the scheduler runs them concurrently
+
+A collector is a function taking the save function (e.g. the write-behind
+queue's `submit`) and returning how many events it produced, registered
+with an interval, a timeout and a cost class ('light', 'io' or 'heavy').
+Settings in config.COLLECTORS override the registered ones. The
+CollectorScheduler runs due collectors in a thread pool on a monotonic
+clock: start times get a little jitter, ticks missed while a collector was
+busy are coalesced into one run, and at most config.COLLECTOR_COST_SLOTS
+collectors of one cost class run at the same time, so a slow scan never
+holds back the others.
+"""
+
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config
+
+
+COST_CLASSES = ('light', 'io', 'heavy')
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, collect, interval=300, timeout=60, cost='light'):
+    """Add (or replace) the collector `name`; returns its settings dict."""
+    settings = {'interval': interval, 'timeout': timeout, 'cost': cost}
+    settings.update(config.COLLECTORS.get(name, {}))
+    if settings['cost'] not in COST_CLASSES:
+        raise ValueError(f"unknown cost class {settings['cost']!r}")
+    spec = dict(settings, name=name, collect=collect)
+    with _registry_lock:
+        _registry[name] = spec
+    return spec
+
+
+def unregister(name):
+    with _registry_lock:
+        _registry.pop(name, None)
+
+
+def registered(skip=()):
+    """The registered collectors (settings dicts), except those named in `skip`."""
+    with _registry_lock:
+        return [spec for name, spec in _registry.items() if name not in skip]
+
+
+def register_builtin():
+    """Register the collectors shipped with the monitor."""
+    from collectors_mainpulations import file_collector
+    from collectors_mainpulations import process_tracker
+    from collectors_mainpulations import shell_history_collector
+    from collectors_mainpulations import user_collector
+
+    register('shell_history', lambda save: shell_history_collector.collect_and_save(save, config.MAX_BASH_COMMANDS),
+             interval=60, timeout=15, cost='io')
+    register('processes', process_tracker.collect_and_save, interval=30, timeout=10, cost='light')
+    register('logins', user_collector.collect_and_save, interval=60, timeout=5, cost='light')
+    register('open_files', lambda save: file_collector.collect_and_save(save, config.MAX_FILES),
+             interval=300, timeout=30, cost='heavy')
+
+
+def _new_stats():
+    return {'runs': 0, 'errors': 0, 'timeouts': 0, 'missed': 0, 'events': 0,
+            'last_ms': 0.0, 'max_ms': 0.0, 'total_ms': 0.0, 'last_run': None, 'last_error': None}
+
+
+class CollectorScheduler:
+    def __init__(self, save_events, collectors=None, workers=None, jitter=None, cost_slots=None):
+        self.save_events = save_events
+        self.collectors = {c['name']: c for c in (registered() if collectors is None else collectors)}
+        self.workers = workers or config.COLLECTOR_WORKERS
+        self.jitter = config.COLLECTOR_JITTER if jitter is None else jitter
+        self.cost_slots = dict(config.COLLECTOR_COST_SLOTS, **(cost_slots or {}))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='collector')
+        self._cond = threading.Condition()
+        self._heap = []        # (fire at, nominal due, name)
+        self._running_since = {}  # name -> monotonic start of the run in progress
+        self._timed_out = set()   # names whose run in progress passed its timeout
+        self._deferred = []       # (nominal due, name) waiting for a run to finish
+        self._active = dict.fromkeys(COST_CLASSES, 0)
+        self._running = False
+        self._thread = None
+        self._stats = {name: _new_stats() for name in self.collectors}
+
+    def start(self):
+        """Start the scheduling thread; the first runs are spread over one jitter window."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            now = time.monotonic()
+            self._heap = [(now + self._jitter(c['interval']), now, name) for name, c in self.collectors.items()]
+            self._deferred = []
+            heapq.heapify(self._heap)
+        self._thread = threading.Thread(target=self._loop, name='collector-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop scheduling; waits up to `timeout` seconds for runs in progress."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._running_since:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def shutdown(self):
+        self.stop(timeout=0)
+        self._pool.shutdown(wait=False)
+
+    def run_now(self, names=None):
+        """Run the collectors (all, or those in `names`) at once, concurrently.
+
+        Waits for each up to its timeout; returns {name: events or None}
+        (None: skipped because it was already running, failed or timed out).
+        """
+        futures = {}
+        for name in names or list(self.collectors):
+            future = self._dispatch(name, force=True)
+            if future is not None:
+                futures[name] = future
+        results = dict.fromkeys(names or self.collectors)
+        if futures:
+            timeout = max(self.collectors[n]['timeout'] for n in futures)
+            wait(futures.values(), timeout=timeout)
+        for name, future in futures.items():
+            if future.done() and not future.cancelled() and not future.exception():
+                results[name] = future.result()
+        return results
+
+    def stats(self):
+        """Per-collector run counts and run times; avg_ms and running_s are derived."""
+        with self._cond:
+            out = {}
+            now = time.monotonic()
+            for name, s in self._stats.items():
+                s = dict(s)
+                s['avg_ms'] = s['total_ms'] / s['runs'] if s['runs'] else 0.0
+                since = self._running_since.get(name)
+                s['running_s'] = None if since is None else now - since
+                out[name] = s
+            return out
+
+    # -- scheduling -----------------------------------------------------
+
+    def _jitter(self, interval):
+        return random.uniform(0, interval * self.jitter)
+
+    def _loop(self):
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                self._check_timeouts(now)
+                if not self._heap:
+                    self._cond.wait(1.0)
+                    continue
+                fire, due, name = self._heap[0]
+                if fire > now:
+                    self._cond.wait(min(fire - now, 1.0))
+                    continue
+                heapq.heappop(self._heap)
+                collector = self.collectors[name]
+                if not self._can_start(collector):
+                    # busy, or its cost class is full: retried when a run finishes
+                    self._deferred.append((due, name))
+                    continue
+                self._start_run(collector)
+                due += collector['interval']
+                if due <= now:
+                    # ticks missed while it was busy collapse into the next run
+                    missed = int((now - due) // collector['interval']) + 1
+                    self._stats[name]['missed'] += missed
+                    due += missed * collector['interval']
+                heapq.heappush(self._heap, (due + self._jitter(collector['interval']), due, name))
+
+    def _check_timeouts(self, now):
+        for name, since in self._running_since.items():
+            if name not in self._timed_out and now - since > self.collectors[name]['timeout']:
+                # a thread can't be killed: count it, it is not started again until it returns
+                self._stats[name]['timeouts'] += 1
+                self._timed_out.add(name)
+
+    def _can_start(self, collector):
+        return (collector['name'] not in self._running_since
+                and self._active[collector['cost']] < self.cost_slots.get(collector['cost'], 1))
+
+    def _dispatch(self, name, force=False):
+        with self._cond:
+            collector = self.collectors[name]
+            if collector['name'] in self._running_since:
+                return None
+            if not force and not self._can_start(collector):
+                return None
+            return self._start_run(collector)
+
+    def _start_run(self, collector):
+        name = collector['name']
+        started = time.monotonic()
+        self._running_since[name] = started
+        self._active[collector['cost']] += 1
+        future = self._pool.submit(collector['collect'], self.save_events)
+        future.add_done_callback(lambda f: self._finished(collector, started, f))
+        return future
+
+    def _finished(self, collector, started, future):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        name = collector['name']
+        with self._cond:
+            self._running_since.pop(name, None)
+            self._active[collector['cost']] -= 1
+            self._timed_out.discard(name)
+            now = time.monotonic()
+            for due, deferred in self._deferred:
+                heapq.heappush(self._heap, (now, due, deferred))
+            self._deferred = []
+            s = self._stats[name]
+            s['runs'] += 1
+            s['last_ms'] = elapsed_ms
+            s['max_ms'] = max(s['max_ms'], elapsed_ms)
+            s['total_ms'] += elapsed_ms
+            s['last_run'] = time.time()
+            error = None if future.cancelled() else future.exception()
+            if error is not None:
+                s['errors'] += 1
+                s['last_error'] = str(error)
+                print(f"Collector {name} error: {error}")
+            elif not future.cancelled() and isinstance(future.result(), int):
+                s['events'] += future.result()
+            self._cond.notify_all()
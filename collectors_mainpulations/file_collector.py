@@ -2,38 +2,109 @@
 """
 File Collector
 Collects opened/accessed files only
+
+Open files come from the /proc/<pid>/fd links of our own processes (no
+`lsof`); the holding processes are stored in the event's `extra` column.
 """
 
 import subprocess
 import os
+import re
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
 import duplicate_checker
+from config import FD_SCAN_WORKERS
+
+
+# one matcher instead of a chain of substring checks: system/temp files,
+# sockets and files deleted while open
+_EXCLUDE = re.compile(r'/proc/|/sys/|/tmp/|\.sock|\(deleted\)$')
+
+
+def _process_uid(pid):
+    try:
+        return os.stat(f'/proc/{pid}').st_uid
+    except OSError:
+        return None
+
+
+def _comm(pid):
+    try:
+        with open(f'/proc/{pid}/comm') as f:
+            return f.read().strip()
+    except OSError:
+        return '?'
+
+
+def _scan_pid(pid, stat_cache):
+    """Regular files open in `pid` as a list of ((dev, ino), path).
+
+    `stat_cache` maps (dev, ino) to the file's path for this scan, or False
+    for what isn't a regular file; a file seen through another path or
+    another process keeps the first path and is checked only once.
+    """
+    fd_dir = f'/proc/{pid}/fd'
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        # exited, or not ours to look at
+        return []
+    found = []
+    for fd in fds:
+        try:
+            path = os.readlink(f'{fd_dir}/{fd}')
+        except OSError:
+            continue
+        # sockets, pipes and anon inodes don't start with '/'
+        if not path.startswith('/') or _EXCLUDE.search(path):
+            continue
+        try:
+            # stat through the fd link: the open file itself, even if renamed
+            st = os.stat(f'{fd_dir}/{fd}')
+        except OSError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        known = stat_cache.get(key)
+        if known is None:
+            known = stat_cache.setdefault(key, path if stat.S_ISREG(st.st_mode) else False)
+        if known:
+            found.append((key, known))
+    return found
+
+
+def scan_open_files(uid=None):
+    """Regular files open by processes of `uid` (default: ours).
+
+    Returns a dict {path: [holder, ...]} with holders as 'comm[pid]'. The
+    /proc/<pid>/fd directories are read in a thread pool; a file is
+    identified by (dev, inode), so one open under several paths (hard links,
+    bind mounts) is reported once, under the first path seen.
+    """
+    uid = os.getuid() if uid is None else uid
+    pids = [e.name for e in os.scandir('/proc') if e.name.isdigit()]
+    pids = [p for p in pids if _process_uid(p) == uid]
+    stat_cache = {}
+    files = {}  # (dev, ino) -> (path, holders)
+    with ThreadPoolExecutor(max_workers=FD_SCAN_WORKERS) as pool:
+        results = pool.map(lambda p: (p, _scan_pid(p, stat_cache)), pids)
+        for pid, found in results:
+            holder = None
+            for key, path in found:
+                if holder is None:
+                    holder = f'{_comm(pid)}[{pid}]'
+                entry = files.setdefault(key, (path, []))
+                if holder not in entry[1]:
+                    entry[1].append(holder)
+    return {path: holders for path, holders in files.values()}
 
 
 def get_open_files(max_files=50):
     """Get list of currently open files"""
     try:
-        # Using lsof to get open files for current user
-        username = os.getenv('USER')
-        output = subprocess.check_output(
-            ['lsof', '-u', username, '-F', 'n'],
-            text=True,
-            stderr=subprocess.DEVNULL
-        )
-        
-        files = []
-        for line in output.split('\n'):
-            if line.startswith('n/'):  # File path starts with n/
-                filepath = line[1:]  # Remove 'n' prefix
-                
-                # Filter only regular files (not sockets, pipes, etc.)
-                if os.path.exists(filepath) and os.path.isfile(filepath):
-                    # Skip system/temp files
-                    if not any(x in filepath for x in ['/proc/', '/sys/', '/tmp/', '.sock']):
-                        files.append(filepath)
-        
-        # Remove duplicates and limit
-        files = list(set(files))[:max_files]
-        return files
+        files = scan_open_files()
+        # files held by the most processes first
+        return sorted(files, key=lambda p: (-len(files[p]), p))[:max_files]
     except:
         return []
 
@@ -56,15 +127,21 @@ def get_recently_modified_files(directory="~", max_files=20):
         return []
 
 
-def collect_and_save(db_save_function, limit=10):
-    """Collect files and save to database"""
-    files = get_open_files()
-    
-    for filepath in files[:limit]:
-        try:
-            h = duplicate_checker.make_hash('file_access', filepath)
-            db_save_function('file_access', filepath, hash_value=h)
-        except Exception:
-            db_save_function('file_access', filepath)
+def collect_and_save(db_save_events, limit=10):
+    """Collect files and save them to database as one batch"""
+    try:
+        files = scan_open_files()
+    except Exception:
+        files = {}
+    paths = sorted(files, key=lambda p: (-len(files[p]), p))[:limit]
+
+    batch = [
+        {'event_type': 'file_access', 'details': filepath,
+         'hash': duplicate_checker.make_hash('file_access', filepath),
+         # which processes hold the file (first few)
+         'extra': ','.join(files[filepath][:3])}
+        for filepath in paths
+    ]
+    db_save_events(batch)
     
-    return len(files[:limit])
+    return len(batch)
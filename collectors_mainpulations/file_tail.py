@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+File Tail
+Reads only what was appended to a file since the stored cursor
+
+A cursor is the dict kept by database/collector_cursors.py: inode, size,
+byte offset and `tail`, the last lines before the offset. If the bytes
+before the offset no longer match (truncated, rewritten or rotated file),
+or the inode changed (file replaced), reading resumes after the last
+occurrence of `tail`; if that is gone too, the whole file is returned with
+`resumed` False. A single record longer than `max_bytes` is skipped.
+"""
+
+import os
+
+
+# the last lines before the offset (at most TAIL_BYTES) find the position
+# again after a rewrite; shells trim the head of the file, so keep it short
+TAIL_LINES = 2
+TAIL_BYTES = 256
+
+
+def _resume_offset(f, st, state, window=None):
+    """Offset to continue from, or None when the old position can't be found."""
+    offset, tail = state['offset'], state['tail']
+    size = st.st_size
+    same_file = state.get('inode') in (None, st.st_ino)
+    if same_file and offset <= size:
+        # same file grown (or untouched): the bytes before the offset must still match
+        f.seek(offset - len(tail))
+        if f.read(len(tail)) == tail:
+            return offset
+    if not tail:
+        return None
+    # rewritten, rotated or replaced (new inode): continue after the last
+    # occurrence of what we had read, searching at most the last `window` bytes
+    start = 0 if window is None else max(0, size - window)
+    f.seek(start)
+    data = f.read()
+    pos = data.rfind(tail)
+    return None if pos < 0 else start + pos + len(tail)
+
+
+def _tail_lines(f, offset):
+    f.seek(max(0, offset - TAIL_BYTES))
+    tail = f.read(offset - max(0, offset - TAIL_BYTES))
+    cut = len(tail) - 1
+    for _ in range(TAIL_LINES):
+        if cut < 0:
+            break
+        cut = tail.rfind(b'\n', 0, cut)
+    return tail[cut + 1:] if cut >= 0 else tail
+
+
+def _next_line(f, offset, chunk=65536):
+    """Offset just past the next newline at or after `offset`, or None if there is none yet."""
+    f.seek(offset)
+    pos = offset
+    while True:
+        block = f.read(chunk)
+        if not block:
+            return None
+        cut = block.find(b'\n')
+        if cut >= 0:
+            return pos + cut + 1
+        pos += len(block)
+
+
+def read_new(path, state, complete=None, max_bytes=None):
+    """Return (data, cursor, resumed) for the bytes appended since `state`.
+
+    `complete(data)` returns how many leading bytes form whole records
+    (default: up to the last newline); the rest is read again next time.
+    `max_bytes` bounds a single read. `cursor` is (inode, size, offset, tail)
+    for collector_cursors.save. Raises OSError if the file can't be read.
+    """
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        offset = _resume_offset(f, st, state, max_bytes) if state is not None else None
+        resumed = offset is not None
+        offset = offset or 0
+        skip_partial = False
+        if not resumed and max_bytes is not None and st.st_size > max_bytes:
+            # starting over on a big file: only its last max_bytes
+            offset = st.st_size - max_bytes
+            skip_partial = True
+
+        f.seek(offset)
+        size = st.st_size - offset
+        if max_bytes is not None:
+            size = min(size, max_bytes)
+        data = f.read(max(0, size))
+        if skip_partial:
+            # drop the partial line we landed in
+            cut = data.find(b'\n') + 1
+            offset += cut
+            data = data[cut:]
+        end = complete(data) if complete else data.rfind(b'\n') + 1
+        new_offset = offset + end
+        if end == 0 and max_bytes is not None and len(data) >= max_bytes:
+            # one record longer than max_bytes: skip it instead of stalling here
+            # (until its newline is written the read waits here)
+            new_offset = _next_line(f, offset + len(data)) or offset
+        tail = _tail_lines(f, new_offset)
+
+    return data[:end], (st.st_ino, st.st_size, new_offset, tail), resumed
+
+
+def handed_off(path, cursor, offsets, count):
+    """Cursor to save when only the first `count` records read were handed off.
+
+    `offsets` are the start offsets of the records returned by read_new.
+    With all of them handed off this is `cursor` itself; otherwise it points
+    at the first record left over, so the next read returns it again.
+    """
+    if count >= len(offsets):
+        return cursor
+    offset = offsets[count]
+    with open(path, 'rb') as f:
+        return cursor[0], cursor[1], offset, _tail_lines(f, offset)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Inotify Watcher
+Real-time file activity from inotify (through ctypes, no extra dependency)
+
+Watches the trees in config.WATCH_DIRECTORIES, skipping hidden and excluded
+directories and stopping at config.WATCH_MAX_DIRS watches. Bursts of
+events on one file are coalesced: a file is reported once it has been
+quiet for config.WATCH_COALESCE_SECONDS, files created and deleted inside
+that window are not reported at all. After a queue overflow the watched
+directories are rescanned for files modified since the last event seen.
+Events are stored as 'file_access' with session_id 'inotify/<action>'.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import re
+import select
+import struct
+import threading
+import time
+
+import config
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+# a newer action wins over an older one, a creation is never downgraded
+_RANK = {'modified': 0, 'moved': 1, 'created': 2}
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return _libc
+
+
+def _excluded_file(path):
+    # the database itself (and its -wal/-shm) would feed every write back in
+    return path.startswith(os.path.abspath(config.DB_FILE)) or _FILE_EXCLUDE.search(path) is not None
+
+
+_FILE_EXCLUDE = re.compile(config.WATCH_EXCLUDE_FILES)
+
+
+def _excluded_dir(name):
+    return name.startswith('.') or name in config.WATCH_EXCLUDE_DIRS
+
+
+class InotifyWatcher:
+    def __init__(self, save_events, roots=None, max_watches=None, coalesce_seconds=None):
+        self.save_events = save_events
+        self.roots = [os.path.abspath(os.path.expanduser(r)) for r in (roots or config.WATCH_DIRECTORIES)]
+        self.max_watches = max_watches or config.WATCH_MAX_DIRS
+        self.coalesce_seconds = config.WATCH_COALESCE_SECONDS if coalesce_seconds is None else coalesce_seconds
+        self._fd = None
+        self._wd_path = {}
+        self._path_wd = {}
+        self._pending = {}  # path -> [action, first ts, last monotonic]
+        self._last_event_ts = time.time()
+        self._running = False
+        self._thread = None
+        self._budget_hit = False
+        self._stats = {'events': 0, 'reported': 0, 'overflows': 0}
+
+    def start(self):
+        """Start the reader thread, which sets up the watches first (raises OSError without inotify)."""
+        libc = _load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='inotify', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(self.coalesce_seconds + 2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._flush(force=True)
+
+    def stats(self):
+        """Watch count and counters: raw events, reported files, overflows."""
+        s = dict(self._stats)
+        s['watches'] = len(self._wd_path)
+        s['pending'] = len(self._pending)
+        return s
+
+    # -- watches --------------------------------------------------------
+
+    def _add_watch(self, path):
+        if len(self._wd_path) >= self.max_watches:
+            if not self._budget_hit:
+                print(f"inotify: watch budget of {self.max_watches} directories reached")
+                self._budget_hit = True
+            return False
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                # fs.inotify.max_user_watches reached
+                self._budget_hit = True
+            return False
+        self._wd_path[wd] = path
+        self._path_wd[path] = wd
+        return True
+
+    def _add_tree(self, root):
+        """Watch `root` and its subdirectories breadth first, within the budget."""
+        queue = [root]
+        while queue and self._running:
+            path = queue.pop(0)
+            if path not in self._path_wd and not self._add_watch(path):
+                if self._budget_hit:
+                    return
+                continue
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not _excluded_dir(entry.name):
+                            queue.append(entry.path)
+            except OSError:
+                continue
+
+    def _remove_tree(self, root):
+        prefix = root + os.sep
+        for path in [p for p in self._path_wd if p == root or p.startswith(prefix)]:
+            wd = self._path_wd.pop(path)
+            self._wd_path.pop(wd, None)
+            _libc.inotify_rm_watch(self._fd, wd)
+
+    # -- events ---------------------------------------------------------
+
+    def _loop(self):
+        # thousands of directories: walked here, not in the thread that started us
+        for root in self.roots:
+            self._add_tree(root)
+        while self._running:
+            timeout = self.coalesce_seconds if self._pending else 1.0
+            try:
+                ready, _, _ = select.select([self._fd], [], [], timeout)
+            except (OSError, ValueError):
+                break
+            if ready:
+                try:
+                    data = os.read(self._fd, 65536)
+                except BlockingIOError:
+                    data = b''
+                self._handle(data)
+            self._flush()
+
+    def _handle(self, data):
+        offset = 0
+        now = time.time()
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            self._stats['events'] += 1
+
+            if mask & IN_Q_OVERFLOW:
+                self._recover()
+                continue
+            if mask & IN_IGNORED:
+                path = self._wd_path.pop(wd, None)
+                if path is not None:
+                    self._path_wd.pop(path, None)
+                continue
+            directory = self._wd_path.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not _excluded_dir(os.fsdecode(name)):
+                    self._add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(path)
+                continue
+            if _excluded_file(path):
+                continue
+            if mask & IN_DELETE or mask & IN_MOVED_FROM:
+                # gone before it was reported: nothing to say about it
+                self._pending.pop(path, None)
+                continue
+            if mask & IN_CREATE:
+                action = 'created'
+            elif mask & IN_MOVED_TO:
+                action = 'moved'
+            else:
+                action = 'modified'
+            self._touch(path, action, now)
+            self._last_event_ts = now
+
+    def _touch(self, path, action, ts):
+        entry = self._pending.get(path)
+        if entry is None:
+            self._pending[path] = [action, int(ts), time.monotonic()]
+        else:
+            if _RANK[action] > _RANK[entry[0]]:
+                entry[0] = action
+            entry[2] = time.monotonic()
+
+    def _recover(self):
+        """Queue overflow: events were lost, rescan for what changed since the last one."""
+        self._stats['overflows'] += 1
+        since = self._last_event_ts - 1
+        # watches may have been freed since the budget was hit
+        self._budget_hit = False
+        for root in self.roots:
+            self._add_tree(root)
+        for directory in list(self._path_wd):
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if (entry.is_file(follow_symlinks=False) and not _excluded_file(entry.path)
+                                and entry.stat(follow_symlinks=False).st_mtime >= since):
+                            self._touch(entry.path, 'modified', time.time())
+            except OSError:
+                continue
+        self._last_event_ts = time.time()
+
+    def _flush(self, force=False):
+        if not self._pending:
+            return
+        quiet_since = time.monotonic() - self.coalesce_seconds
+        done = [p for p, e in self._pending.items() if force or e[2] <= quiet_since]
+        if not done:
+            return
+        batch = []
+        for path in done:
+            action, ts, _ = self._pending.pop(path)
+            batch.append({'event_type': 'file_access', 'details': path,
+                          'session_id': f'inotify/{action}', 'ts': ts})
+        self._stats['reported'] += len(batch)
+        try:
+            self.save_events(batch)
+        except Exception as e:
+            print(f"inotify save error: {e}")
+
+
+def start(save_events):
+    """Start an InotifyWatcher feeding `save_events`; returns it, or None if inotify is unavailable."""
+    watcher = InotifyWatcher(save_events)
+    try:
+        watcher.start()
+    except (OSError, AttributeError):
+        return None
+    return watcher
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Proc Connector Collector
+Captures every exec/exit through the Linux netlink process connector
+
+The kernel multicasts PROC_EVENT_EXEC / PROC_EVENT_EXIT to subscribers of
+the proc connector (needs CAP_NET_ADMIN, i.e. root). The receiving thread
+only parses and queues the messages, so it keeps up with exec storms
+instead of losing events to ENOBUFS; a second thread reads the owner and
+cmdline of each exec as soon as it is dequeued. Processes that were
+already running are only known by their comm. Events
+are batched and handed to the save function every
+config.PROC_EVENTS_FLUSH_SECONDS. Without the privilege the collector falls
+back to polling /proc with the ProcessTracker every config.PROC_POLL_SECONDS.
+"""
+
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+import config
+from collectors_mainpulations import process_collector as procs
+from collectors_mainpulations.process_tracker import ProcessTracker, process_event
+
+
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+NLMSG_DONE = 3
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+
+_NLMSGHDR = struct.Struct('=IHHII')     # len, type, flags, seq, pid
+_CN_MSG = struct.Struct('=IIIIHH')      # idx, val, seq, ack, len, flags
+_PROC_EVENT = struct.Struct('=IIQ')     # what, cpu, timestamp_ns
+_EXEC = struct.Struct('=II')            # pid, tgid
+_EXIT = struct.Struct('=IIII')          # pid, tgid, exit_code, exit_signal
+
+
+def _control_message(op):
+    payload = struct.pack('=I', op)
+    cn = _CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0)
+    length = _NLMSGHDR.size + len(cn) + len(payload)
+    return _NLMSGHDR.pack(length, NLMSG_DONE, 0, 0, os.getpid()) + cn + payload
+
+
+def open_socket():
+    """Subscribe to the proc connector; raises OSError/PermissionError without privileges."""
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+    try:
+        sock.bind((os.getpid(), CN_IDX_PROC))
+        sock.send(_control_message(PROC_CN_MCAST_LISTEN))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def parse_messages(data):
+    """Yield ('exec', pid, None) / ('exit', pid, exit_code) from one recv buffer."""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length = _NLMSGHDR.unpack_from(data, offset)[0]
+        if length < _NLMSGHDR.size:
+            return
+        body = offset + _NLMSGHDR.size + _CN_MSG.size
+        if body + _PROC_EVENT.size <= offset + length:
+            what = _PROC_EVENT.unpack_from(data, body)[0]
+            event = body + _PROC_EVENT.size
+            if what == PROC_EVENT_EXEC:
+                pid, tgid = _EXEC.unpack_from(data, event)
+                yield 'exec', tgid, None
+            elif what == PROC_EVENT_EXIT:
+                pid, tgid, exit_code, _ = _EXIT.unpack_from(data, event)
+                if pid == tgid:
+                    # thread exits have pid != tgid
+                    yield 'exit', tgid, exit_code
+        # messages are 4-byte aligned
+        offset += (length + 3) & ~3
+
+
+class ProcEventCollector:
+    def __init__(self, save_events, poll_seconds=None, flush_seconds=None):
+        self.save_events = save_events
+        self.poll_seconds = poll_seconds or config.PROC_POLL_SECONDS
+        self.flush_seconds = flush_seconds or config.PROC_EVENTS_FLUSH_SECONDS
+        self.mode = None  # 'netlink' or 'poll' once started
+        self._running = False
+        self._thread = None
+        self._resolver = None
+        self._queue = queue.Queue()  # (message, ts) from the recv loop, None to stop
+        self._sock = None
+        self._live = {}  # pid -> {'pid', 'user', 'command', 'started'}
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def start(self):
+        """Start capturing on a daemon thread; returns the mode in use."""
+        try:
+            self._sock = open_socket()
+            self._sock.settimeout(self.flush_seconds)
+            self.mode = 'netlink'
+            target = self._netlink_loop
+        except OSError:
+            self.mode = 'poll'
+            target = self._poll_loop
+        self._running = True
+        self._thread = threading.Thread(target=target, name='proc-events', daemon=True)
+        self._thread.start()
+        if self.mode == 'netlink':
+            self._resolver = threading.Thread(target=self._resolve_loop, name='proc-events-resolve', daemon=True)
+            self._resolver.start()
+        return self.mode
+
+    def stop(self):
+        self._running = False
+        if self._sock is not None:
+            try:
+                self._sock.send(_control_message(PROC_CN_MCAST_IGNORE))
+            except OSError:
+                pass
+            self._sock.close()
+        if self._thread:
+            self._thread.join(self.flush_seconds + self.poll_seconds)
+        if self._resolver:
+            self._queue.put(None)
+            self._resolver.join(self.flush_seconds)
+        self._flush(force=True)
+
+    def _seed(self):
+        # processes running before we subscribed: known by comm only
+        boot = procs.boot_time()
+        tck = os.sysconf('SC_CLK_TCK')
+        for pid, comm, _, start, _, kernel_thread in procs.iter_stats():
+            if not kernel_thread:
+                self._live[pid] = {'pid': pid, 'user': None, 'command': f'[{comm}]', 'started': boot + start // tck}
+
+    def _netlink_loop(self):
+        while self._running:
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                data = b''
+            except OSError:
+                # ENOBUFS: the kernel dropped events, keep going
+                if not self._running:
+                    break
+                continue
+            now = int(time.time())
+            for message in parse_messages(data):
+                self._queue.put((message, now))
+
+    def _resolve_loop(self):
+        """Handle the queued messages in order, reading /proc off the recv loop."""
+        self._seed()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                (kind, pid, exit_code), now = item
+                if kind == 'exec':
+                    self._on_exec(pid, now)
+                else:
+                    self._on_exit(pid, exit_code, now)
+            self._flush()
+
+    def _on_exec(self, pid, now):
+        user, command = procs.owner_and_command(pid, '?')
+        info = {'pid': pid, 'user': user, 'command': command, 'started': now}
+        self._live[pid] = info
+        self._pending.append(process_event('process_start', info, now))
+
+    def _on_exit(self, pid, exit_code, now):
+        info = self._live.pop(pid, None)
+        if info is None:
+            return
+        if info['user'] is None:
+            info['user'] = '?'
+        # exit_code is the wait(2) status
+        extra = {'lifetime_s': max(0, now - info['started']), 'exit_code': exit_code >> 8}
+        if exit_code & 0x7f:
+            extra['signal'] = exit_code & 0x7f
+        self._pending.append(process_event('process_exit', info, now, extra))
+
+    def _poll_loop(self):
+        tracker = ProcessTracker()
+        while self._running:
+            try:
+                self._pending.extend(tracker.poll())
+            except Exception:
+                pass
+            self._flush()
+            time.sleep(self.poll_seconds)
+
+    def _flush(self, force=False):
+        if not self._pending:
+            return
+        if not force and time.monotonic() - self._last_flush < self.flush_seconds:
+            return
+        batch, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        try:
+            self.save_events(batch)
+        except Exception as e:
+            print(f"Process events save error: {e}")
+
+
+def start(save_events):
+    """Start a ProcEventCollector feeding `save_events`; returns it."""
+    collector = ProcEventCollector(save_events)
+    collector.start()
+    return collector
@@ -2,39 +2,155 @@
 """
 Process Collector
 Collects running processes only
+
+Reads /proc directly instead of forking `ps`: one pass over /proc/<pid>/stat
+gives CPU time, start time and RSS for every process, heapq picks the top N
+by CPU and by RSS, and only those winners get their cmdline and owner read.
+`cpu` is the lifetime average like `ps` shows (CPU time / elapsed time).
 """
 
-import subprocess
+import heapq
 import json
+import os
+import pwd
+
+
+PROC = '/proc'
+_CLK_TCK = os.sysconf('SC_CLK_TCK')
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+_users = {}
+
+
+def _user_name(uid):
+    if uid not in _users:
+        try:
+            _users[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            _users[uid] = str(uid)
+    return _users[uid]
+
+
+def _read(path, mode='r'):
+    with open(path, mode) as f:
+        return f.read()
+
+
+def _mem_total_kb():
+    for line in _read(f'{PROC}/meminfo').splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1])
+    return 0
+
+
+PF_KTHREAD = 0x00200000
+
+
+def boot_time():
+    """Epoch seconds the system booted (start ticks count from here)."""
+    for line in _read(f'{PROC}/stat').splitlines():
+        if line.startswith('btime '):
+            return int(line.split()[1])
+    return 0
+
+
+def read_stat(pid):
+    """Return (comm, cpu_ticks, start_ticks, rss_bytes, kernel_thread) from /proc/<pid>/stat, or None."""
+    # raw os.open/os.read: the buffered text layer of open() costs more than the read
+    try:
+        fd = os.open(f'{PROC}/{pid}/stat', os.O_RDONLY)
+        try:
+            data = os.read(fd, 4096)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    return parse_stat(data)
+
+
+def parse_stat(data):
+    """(comm, cpu_ticks, start_ticks, rss_bytes, kernel_thread) from the bytes of a stat file."""
+    # comm may contain spaces and parentheses, the last ')' ends it
+    open_paren = data.find(b'(')
+    close_paren = data.rfind(b')')
+    comm = data[open_paren + 1:close_paren].decode('utf-8', 'replace')
+    fields = data[close_paren + 2:].split()
+    # fields[0] is field 3 (state) of proc(5)
+    kernel_thread = bool(int(fields[6]) & PF_KTHREAD)
+    utime, stime = int(fields[11]), int(fields[12])
+    start = int(fields[19])
+    rss = int(fields[21]) * _PAGE_SIZE
+    return comm, utime + stime, start, rss, kernel_thread
+
+
+def iter_stats():
+    """Yield (pid, comm, cpu_ticks, start_ticks, rss_bytes, kernel_thread) for every process."""
+    for entry in os.scandir(PROC):
+        if not entry.name.isdigit():
+            continue
+        stat = read_stat(entry.name)
+        if stat is None:
+            # exited while we were scanning
+            continue
+        yield (int(entry.name),) + stat
+
+
+def scan_processes():
+    """One pass over /proc: list of (pid, comm, cpu_percent, rss_bytes)."""
+    uptime_ticks = float(_read(f'{PROC}/uptime').split()[0]) * _CLK_TCK
+    procs = []
+    for pid, comm, cpu_ticks, start, rss, _ in iter_stats():
+        elapsed = uptime_ticks - start
+        cpu = 100.0 * cpu_ticks / elapsed if elapsed > 0 else 0.0
+        procs.append((pid, comm, cpu, rss))
+    return procs
+
+
+def owner_and_command(pid, comm):
+    """Return (user, command line) of `pid`; `[comm]` when there is no cmdline."""
+    try:
+        user = _user_name(os.stat(f'{PROC}/{pid}').st_uid)
+        cmdline = _read(f'{PROC}/{pid}/cmdline', 'rb').replace(b'\0', b' ').strip()
+        return user, cmdline.decode('utf-8', 'replace') or f'[{comm}]'
+    except OSError:
+        return '?', f'[{comm}]'
+
+
+def _describe(pid, comm, cpu, rss, mem_total):
+    """Full record for a selected process (owner and command line read here)."""
+    user, command = owner_and_command(pid, comm)
+    mem = 100.0 * rss / (mem_total * 1024) if mem_total else 0.0
+    return {'pid': pid, 'user': user, 'cpu': f'{cpu:.1f}', 'mem': f'{mem:.1f}',
+            'rss_kb': rss // 1024, 'command': command}
+
+
+def top_processes(n=5, by=('cpu', 'rss')):
+    """Top `n` processes for each key in `by` ('cpu', 'rss'), merged without duplicates."""
+    procs = scan_processes()
+    keys = {'cpu': lambda p: p[2], 'rss': lambda p: p[3]}
+    picked = {}
+    for name in by:
+        for p in heapq.nlargest(n, procs, key=keys[name]):
+            picked.setdefault(p[0], p)
+    mem_total = _mem_total_kb()
+    return [_describe(*p, mem_total) for p in picked.values()]
 
 
 def get_running_processes(max_processes=20):
-    """Get list of running processes"""
+    """Get the heaviest running processes (by CPU)"""
     try:
-        output = subprocess.check_output(['ps', 'aux'], text=True)
-        lines = output.strip().split('\n')[1:]  # Skip header
-        
-        processes = []
-        for line in lines[:max_processes]:
-            parts = line.split(None, 10)
-            if len(parts) >= 11:
-                processes.append({
-                    'user': parts[0],
-                    'cpu': parts[2],
-                    'mem': parts[3],
-                    'command': parts[10]
-                })
-        
-        return processes
+        return top_processes(max_processes, by=('cpu',))
     except:
         return []
 
 
-def collect_and_save(db_save_function, limit=5):
-    """Collect processes and save to database"""
-    processes = get_running_processes()
-    
-    for proc in processes[:limit]:
-        db_save_function('running_process', json.dumps(proc))
-    
-    return len(processes[:limit])
+def collect_and_save(db_save_events, limit=5):
+    """Collect the top processes by CPU and by memory and save them as one batch"""
+    try:
+        processes = top_processes(limit)
+    except Exception:
+        processes = []
+
+    batch = [{'event_type': 'running_process', 'details': json.dumps(proc)} for proc in processes]
+    db_save_events(batch)
+
+    return len(batch)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Process Tracker
+Emits process_start / process_exit events instead of periodic snapshots
+
+Processes are keyed by (pid, start time), so a recycled pid is a new
+process. Between polls the tracker keeps every live process with its CPU
+ticks; a poll reports the keys that appeared and disappeared, and an exit
+carries the CPU seconds used. A stable host writes nothing.
+Processes that start and exit between two polls are not seen.
+"""
+
+import json
+import os
+import threading
+import time
+
+from collectors_mainpulations import process_collector as procs
+
+
+_CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def process_event(event_type, info, ts, extra=None):
+    """process_start / process_exit event dict for a process `info` (pid, user, command)."""
+    details = {'pid': info['pid'], 'user': info['user'], 'command': info['command']}
+    if extra:
+        details.update(extra)
+    return {'event_type': event_type, 'details': json.dumps(details), 'ts': ts}
+
+
+class ProcessTracker:
+    def __init__(self, emit_existing=False):
+        # emit_existing: report already running processes as started on the first poll
+        self.emit_existing = emit_existing
+        self._known = {}  # (pid, start_ticks) -> dict
+        self._last_poll = None
+        self._boot = procs.boot_time()
+        self._lock = threading.Lock()
+
+    def _started_at(self, start_ticks):
+        return self._boot + start_ticks // _CLK_TCK
+
+    def poll(self):
+        """Scan /proc once; returns a list of process_start / process_exit event dicts."""
+        with self._lock:
+            now = time.time()
+            first = self._last_poll is None
+            events = []
+            seen = {}
+            for pid, comm, cpu_ticks, start, rss, kernel_thread in procs.iter_stats():
+                if kernel_thread:
+                    continue
+                key = (pid, start)
+                info = self._known.get(key)
+                if info is None:
+                    # new process: owner and command line are read once, here
+                    user, command = procs.owner_and_command(pid, comm)
+                    info = {'pid': pid, 'user': user, 'command': command,
+                            'started': self._started_at(start), 'ticks': cpu_ticks}
+                    if not first or self.emit_existing:
+                        events.append(process_event('process_start', info, info['started']))
+                info['ticks'] = cpu_ticks
+                info['rss'] = rss
+                seen[key] = info
+
+            for key, info in self._known.items():
+                if key not in seen:
+                    # CPU time is what the last poll saw, the final ticks are gone with the process
+                    details = {'lifetime_s': max(0, int(now) - info['started']),
+                               'cpu_s': round(info['ticks'] / _CLK_TCK, 2)}
+                    events.append(process_event('process_exit', info, int(now), details))
+
+            self._known = seen
+            self._last_poll = now
+            return events
+
+    def processes(self):
+        """Live processes seen by the last poll: {(pid, start_ticks): info dict}."""
+        with self._lock:
+            return {k: dict(v) for k, v in self._known.items()}
+
+
+_tracker = ProcessTracker()
+
+
+def get_tracker():
+    """Shared tracker used by the dashboard's collection cycles."""
+    return _tracker
+
+
+def collect_and_save(db_save_events):
+    """Save the processes started or exited since the last cycle as one batch"""
+    try:
+        batch = _tracker.poll()
+    except Exception:
+        return 0
+    if batch:
+        db_save_events(batch)
+    return len(batch)
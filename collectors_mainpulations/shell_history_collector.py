@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Shell History Collector
+Collects bash, zsh and fish history of every account in /etc/passwd
+
+History files are tailed in a thread pool, one incremental cursor per file
+(see file_tail.py). Each read is capped at config.HISTORY_MAX_READ_BYTES and
+the whole scan at config.HISTORY_SCAN_TIMEOUT seconds; files that don't
+finish in time are simply picked up again next cycle. Commands are stored
+as 'bash_command' events with `session_id` set to '<user>/<shell>'.
+"""
+
+import os
+import pwd
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config
+from collectors_mainpulations import bash_history_collector as bash
+from collectors_mainpulations import file_tail
+from database import collector_cursors
+
+
+# history files relative to the home directory, per shell
+HISTORY_FILES = (
+    ('bash', '.bash_history'),
+    ('zsh', '.zsh_history'),
+    ('zsh', '.histfile'),
+    ('fish', '.local/share/fish/fish_history'),
+)
+
+_ZSH_EXTENDED = re.compile(rb'^: *(\d+):\d+;(.*)$', re.DOTALL)
+_ZSH_META = 0x83
+
+
+def find_history_files():
+    """Return (user, shell, path) for every readable history file on the host."""
+    found = []
+    seen_homes = set()
+    try:
+        accounts = pwd.getpwall()
+    except Exception:
+        return []
+    for account in accounts:
+        home = account.pw_dir
+        if not home or home in seen_homes or not os.path.isdir(home):
+            continue
+        seen_homes.add(home)
+        for shell, name in HISTORY_FILES:
+            path = os.path.join(home, name)
+            if os.path.isfile(path) and os.access(path, os.R_OK):
+                found.append((account.pw_name, shell, path))
+    return found
+
+
+def _unmetafy(data):
+    # zsh stores bytes >= 0x83 as Meta followed by byte ^ 0x20
+    if _ZSH_META not in data:
+        return data
+    out = bytearray()
+    it = iter(data)
+    for b in it:
+        out.append(next(it, 0x20) ^ 0x20 if b == _ZSH_META else b)
+    return bytes(out)
+
+
+def zsh_complete(data):
+    """Length of the whole zsh entries in `data` (a trailing '\\' continues the entry)."""
+    end = data.rfind(b'\n') + 1
+    while end > 1 and data[end - 2:end - 1] == b'\\':
+        end = data.rfind(b'\n', 0, end - 1) + 1
+    return end
+
+
+def parse_zsh(data):
+    """Parse plain or EXTENDED_HISTORY zsh entries into (command, epoch or None, offset in data)."""
+    commands = []
+    entry = None
+    pos = 0
+    for raw in data.split(b'\n'):
+        if entry is None:
+            entry, start = b'', pos
+        pos += len(raw) + 1
+        # offsets count the metafied bytes on disk; Meta never precedes a newline
+        line = _unmetafy(raw)
+        if line.endswith(b'\\'):
+            entry += line[:-1] + b'\n'
+            continue
+        entry += line
+        m = _ZSH_EXTENDED.match(entry)
+        if m:
+            ts, cmd = int(m.group(1)), m.group(2)
+        else:
+            ts, cmd = None, entry
+        cmd = cmd.strip()
+        if cmd:
+            commands.append((cmd.decode('utf-8', 'ignore'), ts, start))
+        entry = None
+    return commands
+
+
+def fish_complete(data):
+    """Length of the whole fish entries in `data` (an entry is done once it has `when`)."""
+    end = data.rfind(b'\n') + 1
+    start = data.rfind(b'- cmd: ', 0, end)
+    if start >= 0 and (start == 0 or data[start - 1:start] == b'\n'):
+        if b'\n  when: ' not in data[start:end]:
+            return start
+    return end
+
+
+def _fish_unescape(text):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), text)
+
+
+def parse_fish(data):
+    """Parse fish_history YAML entries into (command, epoch or None, offset in data)."""
+    commands = []
+    pos = 0
+    for raw in data.split(b'\n'):
+        start, pos = pos, pos + len(raw) + 1
+        line = raw.decode('utf-8', 'ignore')
+        if line.startswith('- cmd: '):
+            commands.append([_fish_unescape(line[7:]), None, start])
+        elif line.startswith('  when: ') and commands:
+            try:
+                commands[-1][1] = int(line[8:])
+            except ValueError:
+                pass
+    return [tuple(c) for c in commands if c[0].strip()]
+
+
+PARSERS = {
+    'bash': (bash.complete_records, bash.parse_history),
+    'zsh': (zsh_complete, parse_zsh),
+    'fish': (fish_complete, parse_fish),
+}
+
+
+def cursor_name(shell, path):
+    # bash uses the same name as bash_history_collector, so the two share a cursor
+    return f'{shell}_history:{path}'
+
+
+def _read_one(user, shell, path, state, first_run_limit, max_bytes):
+    complete, parse = PARSERS[shell]
+    data, cursor, resumed = file_tail.read_new(path, state, complete, max_bytes)
+    commands = parse(data)
+    if not resumed:
+        commands = commands[-first_run_limit:]
+    start = cursor[2] - len(data)
+    offsets = [start + pos for _, _, pos in commands]
+    events = []
+    for (cmd, ts, _), offset in zip(commands, offsets):
+        # same hash as bash_history_collector: only a re-read of the same bytes is skipped
+        event = {'event_type': 'bash_command', 'details': cmd, 'hash': bash.command_hash(path, offset, cmd),
+                 'session_id': f'{user}/{shell}'}
+        if ts is not None:
+            event['ts'] = ts
+        events.append(event)
+    return events, (path, (cursor_name(shell, path),) + cursor, offsets)
+
+
+def collect_history(first_run_limit=10, files=None):
+    """Tail all history files concurrently; returns (events, reads) of the finished ones.
+
+    Each read is (path, cursor, offsets), the offsets being where the
+    file's events start in it; reads are in the same order as the events.
+    """
+    files = find_history_files() if files is None else files
+    if not files:
+        return [], []
+    states = collector_cursors.load_all()
+    pool = ThreadPoolExecutor(max_workers=config.HISTORY_WORKERS)
+    try:
+        futures = [
+            pool.submit(_read_one, user, shell, path, states.get(cursor_name(shell, path)),
+                        first_run_limit, config.HISTORY_MAX_READ_BYTES)
+            for user, shell, path in files
+        ]
+        done, not_done = wait(futures, timeout=config.HISTORY_SCAN_TIMEOUT)
+        for f in not_done:
+            f.cancel()
+    finally:
+        pool.shutdown(wait=False)
+
+    events, reads = [], []
+    for f in done:
+        try:
+            file_events, read = f.result()
+        except Exception:
+            # unreadable or vanished file, try again next cycle
+            continue
+        events.extend(file_events)
+        reads.append(read)
+    return events, reads
+
+
+def collect_and_save(db_save_events, limit=10):
+    """Collect new commands of all users and shells and save them as one batch
+
+    `db_save_events` returns (accepted, dropped) like WriteBehindQueue.submit;
+    each file's cursor only moves past its accepted commands.
+    """
+    try:
+        batch, reads = collect_history(limit)
+    except Exception:
+        return 0
+    accepted = len(batch)
+    if batch:
+        accepted, _ = db_save_events(batch)
+    cursors = []
+    left = accepted
+    for path, cursor, offsets in reads:
+        count = min(left, len(offsets))
+        left -= count
+        try:
+            cursors.append(cursor[:1] + file_tail.handed_off(path, cursor[1:], offsets, count))
+        except OSError:
+            # can't place it: keep the old cursor, the commands come again
+            continue
+    if cursors:
+        collector_cursors.save_many(cursors)
+    return accepted
@@ -1,27 +1,181 @@
 #!/usr/bin/env python3
 """
 User Collector
-Collects logged in users only
+Collects user logins and logouts
+
+The binary utmp/wtmp records are parsed directly (no `w`). wtmp gets a
+record on every login, logout and boot; the offset already read is kept in
+collector_cursors, so a cycle only parses the records appended since and
+every session is stored exactly once: a 'login' event when it starts and a
+'logout' event with its duration when it ends. Sessions still open between
+cycles are kept in the cursor's tail. Without wtmp the current utmp is
+compared with the sessions seen last time.
 """
 
-import subprocess
+import json
+import os
+import struct
+import time
+
+import config
+from database import collector_cursors
+
+
+RUN_LVL = 1
+BOOT_TIME = 2
+USER_PROCESS = 7
+DEAD_PROCESS = 8
+
+# struct utmp (glibc, same layout on 64-bit and i386): type, pid, line, id,
+# user, host, exit status, session, tv_sec, tv_usec, addr_v6, unused
+_UTMP = struct.Struct('<hxxi32s4s32s256shhiii4i20s')
+
+
+def _text(raw):
+    return raw.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+
+def read_records(path, offset=0):
+    """Parse the records of a utmp/wtmp file from byte `offset`.
+
+    Returns (records, end offset) with records as tuples (type, pid, tty,
+    user, host, ts). A record still being written is left for the next read.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    usable = len(data) - len(data) % _UTMP.size
+    records = [
+        (r[0], r[1], _text(r[2]), _text(r[4]), _text(r[5]), r[9])
+        for r in _UTMP.iter_unpack(memoryview(data)[:usable])
+    ]
+    return records, offset + usable
+
+
+def _event(event_type, tty, user, host, ts, extra=None):
+    details = {'user': user, 'tty': tty, 'host': host}
+    if extra:
+        details.update(extra)
+    return {'event_type': event_type, 'details': json.dumps(details),
+            'session_id': f'{user}/{tty}', 'ts': ts}
+
+
+def _logout(tty, session, ts, reason=None):
+    user, host, started = session
+    extra = {'duration_s': max(0, ts - started)}
+    if reason:
+        extra['reason'] = reason
+    return _event('logout', tty, user, host, ts, extra)
+
+
+def apply_records(sessions, records):
+    """Replay wtmp `records` on the open `sessions` {tty: [user, host, ts]}; returns the events."""
+    events = []
+    for rtype, _, tty, user, host, ts in records:
+        if rtype == USER_PROCESS and tty:
+            if tty in sessions:
+                # the previous session on this tty never wrote its logout
+                events.append(_logout(tty, sessions.pop(tty), ts))
+            sessions[tty] = [user, host, ts]
+            events.append(_event('login', tty, user, host, ts))
+        elif rtype == DEAD_PROCESS and tty in sessions:
+            events.append(_logout(tty, sessions.pop(tty), ts))
+        elif rtype == BOOT_TIME or (rtype == RUN_LVL and user == 'shutdown'):
+            # a shutdown or (after a crash) the next boot ends every open session
+            reason = 'reboot' if rtype == BOOT_TIME else 'shutdown'
+            for tty in list(sessions):
+                events.append(_logout(tty, sessions.pop(tty), ts, reason))
+    return events
+
+
+def _sessions(state):
+    try:
+        return json.loads(state['tail']) if state and state['tail'] else {}
+    except ValueError:
+        return {}
+
+
+def _from_wtmp(path):
+    name = f'wtmp:{path}'
+    state = collector_cursors.load(name)
+    sessions = _sessions(state)
+    st = os.stat(path)
+    offset = state['offset'] if state else 0
+    if state and (state['inode'] != st.st_ino or st.st_size < offset):
+        # rotated or truncated: the new file is read from the start
+        offset = 0
+    records, end = read_records(path, offset)
+    events = []
+    # (offset, sessions) to resume from if the events from here on are not stored
+    marks = []
+    for i, record in enumerate(records):
+        before = (offset + i * _UTMP.size, dict(sessions))
+        new = apply_records(sessions, [record])
+        events.extend(new)
+        marks.extend([before] * len(new))
+    marks.append((end, sessions))
+    return events, [(name, st.st_ino, st.st_size, o, json.dumps(s).encode()) for o, s in marks]
+
+
+def _from_utmp(path):
+    name = f'utmp:{path}'
+    sessions = _sessions(collector_cursors.load(name))
+    st = os.stat(path)
+    current = {tty: [user, host, ts] for rtype, _, tty, user, host, ts in read_records(path)[0]
+               if rtype == USER_PROCESS and tty}
+    now = int(time.time())
+    events = []
+    marks = []
+    for tty in list(sessions):
+        if current.get(tty) != sessions[tty]:
+            marks.append(dict(sessions))
+            events.append(_logout(tty, sessions.pop(tty), now))
+    for tty, session in current.items():
+        if tty not in sessions:
+            marks.append(dict(sessions))
+            sessions[tty] = session
+            events.append(_event('login', tty, *session))
+    marks.append(sessions)
+    return events, [(name, st.st_ino, st.st_size, 0, json.dumps(s).encode()) for s in marks]
+
+
+def collect_logins(wtmp_path=None, utmp_path=None):
+    """Login/logout events since the last call; returns (events, cursors).
+
+    `cursors[n]` is the cursor to save once the first n events are stored.
+    """
+    wtmp_path = wtmp_path or config.WTMP_FILE
+    if os.path.exists(wtmp_path):
+        return _from_wtmp(wtmp_path)
+    return _from_utmp(utmp_path or config.UTMP_FILE)
 
 
 def get_logged_users():
     """Get currently logged in users"""
     try:
-        output = subprocess.check_output(['w', '-h'], text=True)
-        users = [line.strip() for line in output.strip().split('\n') if line.strip()]
-        return users
-    except:
+        records, _ = read_records(config.UTMP_FILE)
+    except OSError:
         return []
+    users = []
+    for rtype, _, tty, user, host, ts in records:
+        if rtype == USER_PROCESS and tty:
+            since = time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))
+            users.append(f"{user} {tty} {host or '-'} {since}")
+    return users
+
 
+def collect_and_save(db_save_events):
+    """Collect new logins/logouts and save them to database as one batch
 
-def collect_and_save(db_save_function):
-    """Collect users and save to database"""
-    users = get_logged_users()
-    
-    for user in users:
-        db_save_function('logged_user', user)
-    
-    return len(users)
+    `db_save_events` returns (accepted, dropped) like WriteBehindQueue.submit;
+    the cursor only moves past the accepted events.
+    """
+    try:
+        batch, cursors = collect_logins()
+    except Exception:
+        return 0
+    accepted = len(batch)
+    if batch:
+        accepted, _ = db_save_events(batch)
+    collector_cursors.save(*cursors[accepted])
+    return accepted
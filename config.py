@@ -6,14 +6,114 @@ Settings and Configuration
 # Database
 DB_FILE = 'user_activity.db'
 
+# Database tuning (see database/connection_manager.py)
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 8192
+DB_MMAP_SIZE = 64 * 1024 * 1024
+DB_SYNCHRONOUS = 'NORMAL'  # safe with WAL, avoids an fsync per commit
+
+# Storage mode (see database/partitions.py)
+# None keeps one activity_log table; 'day' or 'month' splits events into
+# time partitions behind an activity_log view.
+PARTITION_MODE = None
+
 # Collection limits
 MAX_BASH_COMMANDS = 10
 MAX_PROCESSES = 5
 MAX_FILES = 10
+FD_SCAN_WORKERS = 8              # threads reading /proc/<pid>/fd for open files
+
+# Shell history of all users (see collectors_mainpulations/shell_history_collector.py)
+HISTORY_WORKERS = 8                  # files tailed in parallel
+HISTORY_MAX_READ_BYTES = 1024 * 1024 # per file and cycle, the rest follows next cycle
+HISTORY_SCAN_TIMEOUT = 10.0          # seconds for a whole host scan
+
+# Real-time file activity (see collectors_mainpulations/inotify_watcher.py)
+# Replaces the open-file scan of each cycle when inotify is available.
+FILE_WATCH_ENABLED = False
+WATCH_DIRECTORIES = ['~']
+WATCH_MAX_DIRS = 2000            # watch budget; hidden/excluded dirs are never watched
+WATCH_EXCLUDE_DIRS = ('node_modules', '__pycache__', 'venv', 'site-packages')
+WATCH_EXCLUDE_FILES = r'(\.swp|\.swx|\.tmp|\.part|~)$'
+WATCH_COALESCE_SECONDS = 2.0     # report a file once it was quiet this long
+
+# New items scanner index (see new_items_detector.py); None keeps it next to DB_FILE
+NEW_ITEMS_INDEX_FILE = None
+
+# Login records (see collectors_mainpulations/user_collector.py)
+UTMP_FILE = '/var/run/utmp'   # who is logged in now
+WTMP_FILE = '/var/log/wtmp'   # every login, logout and boot
+
+# Event-driven process capture (see collectors_mainpulations/proc_connector.py)
+# Off by default: the netlink connector needs root, otherwise /proc is polled.
+PROC_EVENTS_ENABLED = False
+PROC_POLL_SECONDS = 1.0          # fallback polling interval
+PROC_EVENTS_FLUSH_SECONDS = 1.0  # batch events this long before saving
+
+# Retention (see database/retention.py)
+# Per event_type policies, '*' applies to types without their own entry.
+RETENTION_POLICIES = {
+    '*': {'max_age_days': 180},
+    'bash_command': {'max_age_days': 365},
+    'file_access': {'max_age_days': 180},
+    'running_process': {'max_age_days': 14, 'max_rows': 20000},
+    'process_start': {'max_age_days': 30},
+    'process_exit': {'max_age_days': 30},
+    'logged_user': {'max_age_days': 30, 'max_rows': 5000},
+    'login': {'max_age_days': 365},
+    'logout': {'max_age_days': 365},
+}
+RETENTION_INTERVAL_SECONDS = 3600
+RETENTION_BATCH_SIZE = 2000
+RETENTION_VACUUM_PAGES = 1000
+
+# Write-behind queue (see database/write_behind.py)
+WRITE_QUEUE_MAX_EVENTS = 10000   # bound on events waiting in memory
+WRITE_FLUSH_EVENTS = 500         # flush once this many are pending
+WRITE_FLUSH_SECONDS = 2.0        # ... or once the oldest has waited this long
+WRITE_PUT_TIMEOUT = 5.0          # how long a full queue blocks collectors before dropping
 
 # Auto update
 AUTO_UPDATE_SECONDS = 300
 
+# Collector scheduler (see collectors_mainpulations/collector_registry.py)
+# Per collector overrides of 'interval' / 'timeout' (seconds) and 'cost'
+# ('light', 'io' or 'heavy'), e.g. {'open_files': {'interval': 600}}.
+COLLECTORS = {}
+COLLECTOR_COST_SLOTS = {'light': 4, 'io': 2, 'heavy': 1}  # concurrent runs per cost class
+COLLECTOR_WORKERS = 4
+COLLECTOR_JITTER = 0.1   # start times move by up to this fraction of the interval
+
+# Resource sampler (see resource_sampler.py)
+SAMPLER_INTERVAL_SECONDS = 1.0
+SAMPLER_HISTORY_SECONDS = 3600   # kept in memory per metric (ring buffers)
+
+# Process leaderboard (see system_resources_monitor.ProcessLeaderboard)
+LEADERBOARD_TOP_N = 10
+LEADERBOARD_IDLE_EVERY = 10      # idle processes are re-read every this many ticks
+LEADERBOARD_MAX_HANDLES = 4096   # /proc/<pid>/stat files kept open between ticks
+LEADERBOARD_IO_SWEEP = 3         # idle processes get their I/O read every this many idle rounds
+
+# Metrics store (see database/metrics_store.py)
+# (step, keep) seconds per tier, finest first: raw 2 s for an hour, 1 minute
+# averages/maxima for a week, hourly for a year.
+METRICS_TIERS = [(2, 3600), (60, 7 * 86400), (3600, 365 * 86400)]
+METRICS_SKIP = r'^cpu\.\d+$'   # sampler metrics not persisted (per-core CPU)
+METRICS_FLUSH_SECONDS = 60
+
+# Cgroup v2 accounting (see collectors_mainpulations/cgroup_collector.py)
+CGROUP_ENABLED = True
+CGROUP_ROOT = None               # None finds the cgroup2 mount in /proc/self/mountinfo
+CGROUP_MAX_DEPTH = 3             # e.g. user.slice/user-1000.slice/session-2.scope
+CGROUP_INTERVAL_SECONDS = 10
+CGROUP_RESCAN_SECONDS = 300      # full tree walk, besides the mtime-driven re-listing
+
+# Headless collection daemon (see collection_daemon.py, `main.py --daemon`)
+DAEMON_PID_FILE = None        # None keeps it next to DB_FILE
+DAEMON_NICE = 10              # added niceness, 0 leaves the priority alone
+DAEMON_STATS_SECONDS = 3600   # print collector stats this often, 0 never
+ROLLUP_REFRESH_SECONDS = 300  # how often the collection service folds new events into the rollups
+
 # Window
 WINDOW_WIDTH = 850
 WINDOW_HEIGHT = 650
@@ -4,40 +4,60 @@ Data Analyzer
 Provides analytics functions for the activity monitor using the existing SQLite database.
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
-from config import DB_FILE
+from database import connection_manager as cm
+from database import database_operations as db
+from database import partitions
+from database import rollups
 
 
 class DataAnalyzer:
     def __init__(self, db_path=None):
-        self.db_path = db_path or DB_FILE
+        # None means config.DB_FILE, resolved by the connection manager
+        self.db_path = db_path
 
     def _fetch(self, query, params=()):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cur = conn.cursor()
-            cur.execute(query, params)
-            rows = cur.fetchall()
-            conn.close()
-            return rows
+            return cm.read(query, params, self.db_path)
         except Exception:
             return []
 
+    def _stream(self, query, params=(), batch_size=1000):
+        """Yield rows of `query` in fetchmany batches instead of one big list."""
+        cur = cm.get_reader(self.db_path).cursor()
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _utc_offset():
+        """Current local UTC offset in seconds, used to bucket epoch `ts` into local hours."""
+        # historical rows on the other side of a DST change land one hour off
+        return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+    def _source(self, start, end):
+        """Event source limited to the partitions overlapping start..end."""
+        cur = cm.get_reader(self.db_path).cursor()
+        try:
+            return partitions.source_for_range(start, end, cur)
+        finally:
+            cur.close()
+
     def get_productivity_score(self, days=7):
         """Return an integer score 0-100 based on activity count and active hours."""
         try:
-            end = datetime.now()
-            start = end - timedelta(days=days)
-            q = 'SELECT COUNT(*) FROM activity_log WHERE timestamp >= ?'
-            total = self._fetch(q, (start.strftime('%Y-%m-%d %H:%M:%S'),))
-            total_events = total[0][0] if total else 0
-
-            # count distinct active hours
-            q2 = "SELECT DISTINCT strftime('%Y-%m-%d %H', timestamp) as hr FROM activity_log WHERE timestamp >= ?"
-            hours = self._fetch(q2, (start.strftime('%Y-%m-%d %H:%M:%S'),))
-            active_hours = len(hours)
+            start = datetime.now() - timedelta(days=days)
+            # hourly rollups: at most days*24 rows per event type
+            rows = rollups.hourly(int(start.timestamp()), None, self.db_path)
+            total_events = sum(r[2] for r in rows)
+            active_hours = len({r[0] for r in rows})
 
             # heuristics: expected 8 active hours/day, 20 events/day
             event_density = min(1.0, total_events / (days * 20))
@@ -51,18 +71,20 @@ class DataAnalyzer:
     def get_most_productive_hours(self, days=7, top_n=3):
         """Return top N hours (HH) with highest activity in the given window."""
         try:
-            start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
-            q = "SELECT strftime('%H', timestamp) AS hour, COUNT(*) FROM activity_log WHERE timestamp >= ? GROUP BY hour ORDER BY COUNT(*) DESC LIMIT ?"
-            rows = self._fetch(q, (start, top_n))
-            return [(r[0], r[1]) for r in rows]
+            start = datetime.now() - timedelta(days=days)
+            # epoch hours from the rollup, offset to local hours of the day
+            off = self._utc_offset()
+            by_hour = Counter()
+            for hour, _, count in rollups.hourly(int(start.timestamp()), None, self.db_path):
+                by_hour[(hour * 3600 + off) // 3600 % 24] += count
+            return [(f'{h:02d}', c) for h, c in by_hour.most_common(top_n)]
         except Exception:
             return []
 
     def get_command_patterns(self, top_n=10):
         """Return top commands and their counts."""
         try:
-            q = "SELECT details, COUNT(*) FROM activity_log WHERE event_type='bash_command' GROUP BY details ORDER BY COUNT(*) DESC LIMIT ?"
-            rows = self._fetch(q, (top_n,))
+            rows = db.top_details('bash_command', top_n, self.db_path)
             return [{'command': r[0], 'count': r[1]} for r in rows]
         except Exception:
             return []
@@ -70,8 +92,7 @@ class DataAnalyzer:
     def get_file_activity_patterns(self, top_n=10):
         """Return top file paths and breakdown by extension."""
         try:
-            q = "SELECT details, COUNT(*) FROM activity_log WHERE event_type='file_access' GROUP BY details ORDER BY COUNT(*) DESC LIMIT ?"
-            rows = self._fetch(q, (top_n,))
+            rows = db.top_details('file_access', top_n, self.db_path)
             files = [{'path': r[0], 'count': r[1], 'ext': (r[0].split('.')[-1] if '.' in r[0] else '')} for r in rows]
 
             # extension aggregation
@@ -86,16 +107,17 @@ class DataAnalyzer:
         """Compare this week vs last week total events."""
         try:
             now = datetime.now()
-            # start of this week (Monday)
-            start_this = now - timedelta(days=now.weekday())
+            # start of this week (Monday, local midnight)
+            start_this = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
             start_last = start_this - timedelta(days=7)
-            end_last = start_this - timedelta(seconds=1)
 
-            q = 'SELECT COUNT(*) FROM activity_log WHERE timestamp BETWEEN ? AND ?'
-            this_week = self._fetch(q, (start_this.strftime('%Y-%m-%d %H:%M:%S'), now.strftime('%Y-%m-%d %H:%M:%S')))
-            last_week = self._fetch(q, (start_last.strftime('%Y-%m-%d %H:%M:%S'), end_last.strftime('%Y-%m-%d %H:%M:%S')))
-            tw = this_week[0][0] if this_week else 0
-            lw = last_week[0][0] if last_week else 0
+            # summed from hourly rollups over half-open ranges, so no hour counts twice
+            def total(start, end):
+                rows = rollups.hourly(int(start.timestamp()), int(end.timestamp()), self.db_path)
+                return sum(r[2] for r in rows)
+
+            tw = total(start_this, now)
+            lw = total(start_last, start_this)
             change = None
             if lw == 0:
                 change = None
@@ -111,30 +133,35 @@ class DataAnalyzer:
         Returns list of sessions with start, end, duration_minutes, event_count.
         """
         try:
-            q = 'SELECT timestamp FROM activity_log ORDER BY timestamp ASC'
-            rows = self._fetch(q)
-            times = [datetime.strptime(r[0], '%Y-%m-%d %H:%M:%S') for r in rows if r and r[0]]
-            if not times:
+            # epoch seconds straight from the (ts, event_type) index, no parsing
+            q = f'SELECT ts FROM {self._source(None, None)} ORDER BY ts ASC'
+            times = (r[0] for r in self._stream(q))
+            first = next(times, None)
+            if first is None:
                 return []
 
+            def session(start, end, count):
+                return {'start': datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S'),
+                        'end': datetime.fromtimestamp(end).strftime('%Y-%m-%d %H:%M:%S'),
+                        'duration_min': round((end - start) / 60.0, 1), 'events': count}
+
+            gap = gap_minutes * 60
             sessions = []
-            cur_start = times[0]
-            cur_end = times[0]
+            cur_start = first
+            cur_end = first
             count = 1
-            for t in times[1:]:
-                if (t - cur_end).total_seconds() <= gap_minutes * 60:
+            for t in times:
+                if t - cur_end <= gap:
                     cur_end = t
                     count += 1
                 else:
-                    duration = (cur_end - cur_start).total_seconds() / 60.0
-                    sessions.append({'start': cur_start.strftime('%Y-%m-%d %H:%M:%S'), 'end': cur_end.strftime('%Y-%m-%d %H:%M:%S'), 'duration_min': round(duration, 1), 'events': count})
+                    sessions.append(session(cur_start, cur_end, count))
                     cur_start = t
                     cur_end = t
                     count = 1
 
             # finalize
-            duration = (cur_end - cur_start).total_seconds() / 60.0
-            sessions.append({'start': cur_start.strftime('%Y-%m-%d %H:%M:%S'), 'end': cur_end.strftime('%Y-%m-%d %H:%M:%S'), 'duration_min': round(duration, 1), 'events': count})
+            sessions.append(session(cur_start, cur_end, count))
             return sessions
         except Exception:
             return []
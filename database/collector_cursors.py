@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Collector Cursors
+Remembers how far an incremental collector has read a file
+
+One row per source (e.g. 'bash_history:/home/me/.bash_history'): the file's
+inode and size at the last read, the byte offset consumed so far and the
+last bytes before that offset, which identify the position again after the
+file was rewritten or rotated. A collector may keep its own small state
+in the tail instead (user_collector: the sessions still open).
+"""
+
+import time
+
+from database import connection_manager as cm
+
+
+def create_table(cursor):
+    """Create the cursor table if it is missing."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS collector_cursors (
+            name TEXT PRIMARY KEY,
+            inode INTEGER,
+            size INTEGER,
+            offset INTEGER NOT NULL,
+            tail BLOB,
+            updated_ts INTEGER
+        )
+    ''')
+
+
+def load(name, db_path=None):
+    """Return the stored cursor of `name` as a dict, or None."""
+    rows = cm.read('SELECT inode, size, offset, tail FROM collector_cursors WHERE name = ?', (name,), db_path)
+    if not rows:
+        return None
+    inode, size, offset, tail = rows[0]
+    return {'inode': inode, 'size': size, 'offset': offset, 'tail': tail or b''}
+
+
+def load_all(db_path=None):
+    """Return every stored cursor as a dict {name: cursor dict}."""
+    rows = cm.read('SELECT name, inode, size, offset, tail FROM collector_cursors', (), db_path)
+    return {name: {'inode': inode, 'size': size, 'offset': offset, 'tail': tail or b''}
+            for name, inode, size, offset, tail in rows}
+
+
+def save_many(cursors, db_path=None):
+    """Store several (name, inode, size, offset, tail) cursors in one transaction."""
+    now = int(time.time())
+    with cm.write_transaction(db_path) as cur:
+        cur.executemany(
+            'INSERT OR REPLACE INTO collector_cursors (name, inode, size, offset, tail, updated_ts) VALUES (?, ?, ?, ?, ?, ?)',
+            [tuple(c) + (now,) for c in cursors]
+        )
+
+
+def save(name, inode, size, offset, tail=b'', db_path=None):
+    """Store (or replace) the cursor of `name`."""
+    save_many([(name, inode, size, offset, tail)], db_path)
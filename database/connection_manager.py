@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Connection Manager
+Owns every SQLite connection used by the app.
+
+One long-lived writer connection per database file (serialized by a lock)
+and one read connection per thread. The database runs in WAL mode so the
+collector threads, the system panel thread and the Tk thread can read
+while a write is in progress instead of hitting "database is locked".
+"""
+
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import config
+
+
+_writer_lock = threading.RLock()
+_writers = {}
+_local = threading.local()
+
+
+def _resolve(db_path):
+    # read config at call time so DB_FILE can be changed after import
+    return db_path or config.DB_FILE
+
+
+def _apply_pragmas(conn):
+    """Tune a fresh connection (per-connection pragmas only)."""
+    cur = conn.cursor()
+    cur.execute(f'PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}')
+    cur.execute(f'PRAGMA cache_size = -{int(config.DB_CACHE_SIZE_KB)}')
+    cur.execute(f'PRAGMA mmap_size = {int(config.DB_MMAP_SIZE)}')
+    cur.execute(f'PRAGMA synchronous = {config.DB_SYNCHRONOUS}')
+    cur.execute('PRAGMA temp_store = MEMORY')
+
+
+def _open(db_path):
+    # isolation_level=None: no implicit transactions, we BEGIN explicitly
+    conn = sqlite3.connect(db_path, timeout=config.DB_BUSY_TIMEOUT_MS / 1000.0,
+                           isolation_level=None, check_same_thread=False)
+    _apply_pragmas(conn)
+    return conn
+
+
+def get_writer(db_path=None):
+    """Return the shared writer connection for `db_path`.
+
+    Callers must hold the writer lock while using it; prefer
+    `write_transaction()` which does that for you.
+    """
+    path = _resolve(db_path)
+    with _writer_lock:
+        conn = _writers.get(path)
+        if conn is None:
+            conn = _open(path)
+            # WAL is persistent in the file, setting it once is enough
+            conn.execute('PRAGMA journal_mode = WAL')
+            _writers[path] = conn
+        return conn
+
+
+@contextmanager
+def write_transaction(db_path=None):
+    """Yield a cursor inside one IMMEDIATE transaction on the writer.
+
+    Commits on success, rolls back and re-raises on error.
+    """
+    with _writer_lock:
+        conn = get_writer(db_path)
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            yield cur
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            cur.close()
+
+
+@contextmanager
+def writer_connection(db_path=None):
+    """Yield the writer connection with the lock held, outside any transaction.
+
+    For statements that cannot run in a transaction (VACUUM, some PRAGMAs).
+    """
+    with _writer_lock:
+        yield get_writer(db_path)
+
+
+def get_reader(db_path=None):
+    """Return this thread's read connection for `db_path`."""
+    path = _resolve(db_path)
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = _open(path)
+        conns[path] = conn
+    return conn
+
+
+def read(query, params=(), db_path=None):
+    """Run a read-only query on this thread's connection and return all rows."""
+    cur = get_reader(db_path).cursor()
+    try:
+        cur.execute(query, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+def close_all():
+    """Close the writer connections and this thread's readers."""
+    with _writer_lock:
+        for conn in _writers.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+        _writers.clear()
+    conns = getattr(_local, 'conns', None) or {}
+    for conn in conns.values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    conns.clear()
+
+
+atexit.register(close_all)
@@ -4,49 +4,49 @@ Database Operations Only
 Everything related to database is here
 """
 
-import sqlite3
+from collections import namedtuple
 from datetime import datetime, timedelta
-from config import DB_FILE
+from database import collector_cursors
+from database import connection_manager as cm
+from database import details_dict
+from database import metrics_store
+from database import partitions
+from database import rollups
+from database import schema
+
+
+# One event as returned by iter_events (same column order as activity_log)
+Event = namedtuple('Event', 'id timestamp event_type details hash session_id ts extra')
 
 
 def create_database():
     """Create database and tables"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    # Create table if missing
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            details TEXT NOT NULL
-        )
-    ''')
-
-    # Ensure new columns exist (migrate if necessary)
-    cursor.execute("PRAGMA table_info(activity_log)")
-    cols = [r[1] for r in cursor.fetchall()]
-    if 'hash' not in cols:
-        try:
-            cursor.execute('ALTER TABLE activity_log ADD COLUMN hash TEXT')
-        except Exception:
-            pass
-    if 'session_id' not in cols:
-        try:
-            cursor.execute('ALTER TABLE activity_log ADD COLUMN session_id TEXT')
-        except Exception:
-            pass
+    _enable_incremental_vacuum()
+    with cm.write_transaction() as cursor:
+        # migrate v1 (details as TEXT per row) to the interned v2 layout
+        migrated = schema.upgrade(cursor)
+        # single events table, or partitions, behind the activity_log view
+        partitions.sync_storage_mode(cursor)
+        # hourly/daily aggregates, filled lazily by rollups.refresh()
+        rollups.create_tables(cursor)
+        # read positions of the incremental (file tailing) collectors
+        collector_cursors.create_table(cursor)
+        # resource metrics in round-robin tiers
+        metrics_store.create_tables(cursor)
+    if migrated:
+        # hand the pages of the dropped v1 tables back in one go
+        with cm.writer_connection() as conn:
+            conn.executescript('PRAGMA incremental_vacuum;')
 
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON activity_log(timestamp)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_type ON activity_log(event_type)')
-    # idx_hash may fail if column missing; wrap in try
-    try:
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_hash ON activity_log(hash)')
-    except Exception:
-        pass
-    
-    conn.commit()
-    conn.close()
+
+def _enable_incremental_vacuum():
+    # retention gives pages back with PRAGMA incremental_vacuum, which needs
+    # auto_vacuum=INCREMENTAL; existing files need one VACUUM to switch mode
+    with cm.writer_connection() as conn:
+        mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        if mode != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
 
 
 def save_event(event_type, details, hash_value=None, session_id=None, skip_if_recent_minutes=5):
@@ -56,78 +56,206 @@ def save_event(event_type, details, hash_value=None, session_id=None, skip_if_re
     if a record with the same hash exists within `skip_if_recent_minutes`.
     Backwards-compatible: callers may omit hash_value and session_id.
     """
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+    event = {'event_type': event_type, 'details': details, 'hash': hash_value, 'session_id': session_id}
+    inserted, _ = save_events([event], skip_if_recent_minutes)
+    return inserted == 1
 
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        # duplicate check
-        if hash_value:
-            window_start = (datetime.now() - timedelta(minutes=skip_if_recent_minutes)).strftime('%Y-%m-%d %H:%M:%S')
-            cursor.execute('SELECT id FROM activity_log WHERE hash = ? AND timestamp >= ?', (hash_value, window_start))
-            if cursor.fetchone():
-                conn.close()
-                return False
+def save_events(batch, skip_if_recent_minutes=5, dedupe_batch=False):
+    """Save a whole collection cycle in one transaction.
 
-        cursor.execute(
-            'INSERT INTO activity_log (timestamp, event_type, details, hash, session_id) VALUES (?, ?, ?, ?, ?)',
-            (timestamp, event_type, details, hash_value, session_id)
-        )
+    `batch` is a list of dicts with keys `event_type`, `details` and
+    optionally `hash`, `session_id`, `ts` (epoch seconds the event
+    happened at, defaults to now) and `extra` (free text kept with the row).
+    Events whose hash is already stored within `skip_if_recent_minutes` are
+    skipped; a back-dated event only if the same hash is stored at the same
+    `ts`. With `dedupe_batch`, repeats of a hash within the batch are skipped too.
+    Returns a tuple (inserted, skipped); on a database error nothing is
+    inserted and the whole batch counts as skipped.
+    """
+    if not batch:
+        return 0, 0
+    try:
+        now = datetime.now()
+        now_ts = int(now.timestamp())
+        window_start = now_ts - skip_if_recent_minutes * 60
 
-        conn.commit()
-        conn.close()
+        with cm.write_transaction() as cursor:
+            recent = partitions.source_for_range(now - timedelta(minutes=skip_if_recent_minutes), None, cursor)
+            # target table per day, so back-dated events land in their own partition
+            tables = {}
+            rows = {}
+            seen = set()
+            interned = {}
+            for event in batch:
+                hash_value = event.get('hash')
+                if hash_value:
+                    # stored as a 64-bit integer, see details_dict.hash64
+                    hash_value = details_dict.hash64(hash_value)
+                    if dedupe_batch:
+                        if hash_value in seen:
+                            continue
+                        seen.add(hash_value)
+                    ts = event.get('ts')
+                    if ts and ts < window_start:
+                        # back-dated (e.g. a history line read again): same hash at the same time
+                        when = datetime.fromtimestamp(ts)
+                        source = partitions.source_for_range(when, when, cursor)
+                        cursor.execute(f'SELECT 1 FROM {source} WHERE hash = ? AND ts = ? LIMIT 1', (hash_value, int(ts)))
+                    else:
+                        cursor.execute(f'SELECT 1 FROM {recent} WHERE hash = ? AND ts >= ? LIMIT 1', (hash_value, window_start))
+                    if cursor.fetchone():
+                        continue
+                else:
+                    hash_value = None
+                details = event['details']
+                if details not in interned:
+                    interned[details] = details_dict.intern(cursor, details)
+                ts = int(event.get('ts') or now_ts)
+                when = datetime.fromtimestamp(ts)
+                day = when.date()
+                if day not in tables:
+                    tables[day] = partitions.target_table(cursor, when)
+                rows.setdefault(tables[day], []).append(
+                    (when.strftime('%Y-%m-%d %H:%M:%S'), event['event_type'], interned[details], hash_value, event.get('session_id'), ts,
+                     event.get('extra'))
+                )
 
-        # trim database size to limit
-        try:
-            trim_database_limit()
-        except Exception:
-            pass
+            for table, table_rows in rows.items():
+                if partitions.enabled():
+                    # keep ids increasing across partitions (rollups track a high-water id)
+                    partitions.continue_ids(cursor, table)
+                cursor.executemany(
+                    f'INSERT INTO {table} (timestamp, event_type, details_id, hash, session_id, ts, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    table_rows
+                )
 
-        return True
+        inserted = sum(len(r) for r in rows.values())
+        return inserted, len(batch) - inserted
     except Exception as e:
         print(f"Database error: {e}")
-        return False
-
-
-def trim_database_limit(max_records=1000):
-    """Keep the activity_log table to at most `max_records` by deleting oldest entries."""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        cur = conn.cursor()
-        cur.execute('SELECT COUNT(*) FROM activity_log')
-        total = cur.fetchone()[0]
-        if total > max_records:
-            # delete oldest rows
-            to_delete = total - max_records
-            cur.execute('DELETE FROM activity_log WHERE id IN (SELECT id FROM activity_log ORDER BY timestamp ASC LIMIT ?)', (to_delete,))
-            conn.commit()
-        conn.close()
-    except Exception:
-        pass
+        return 0, len(batch)
 
 
 def get_all_events():
-    """Get all events from database"""
+    """Get all events from database (loads everything; prefer iter_events)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM activity_log ORDER BY timestamp DESC')
-        events = cursor.fetchall()
-        conn.close()
-        return events
+        return list(iter_events())
     except:
         return []
 
 
+def iter_events(event_type=None, start=None, end=None, batch_size=500, db_path=None):
+    """Yield events newest first as `Event` tuples, in constant memory.
+
+    Optional filters: `event_type`, and a time window `start` <= t < `end`
+    (datetimes). Rows are read `batch_size` at a time with keyset
+    pagination on (ts, id) - each page continues below the last row of the
+    previous one, so there is no OFFSET and no full sort. With partitions
+    only the overlapping ones are read, newest first.
+    """
+    if partitions.enabled():
+        cur = cm.get_reader(db_path).cursor()
+        try:
+            tables = [t for t in reversed(partitions.list_partitions(cur)) if _overlaps(t, start, end)]
+        finally:
+            cur.close()
+    else:
+        tables = ['events']
+
+    for table in tables:
+        yield from _iter_table(table, event_type, start, end, batch_size, db_path)
+
+
+def _overlaps(partition, start, end):
+    p_start, p_end = partitions.partition_bounds(partition)
+    return (start is None or p_end > start) and (end is None or p_start < end)
+
+
+def _iter_table(table, event_type, start, end, batch_size, db_path):
+    where = []
+    params = []
+    if event_type is not None:
+        # (event_type, ts) index; the keyset only needs (ts, id)
+        where.append('e.event_type = ?')
+        params.append(event_type)
+        keyset = '(e.ts, e.id) < (?, ?)'
+        order = 'e.ts DESC, e.id DESC'
+    else:
+        # (ts, event_type) index; event_type joins the keyset to match it
+        keyset = '(e.ts, e.event_type, e.id) < (?, ?, ?)'
+        order = 'e.ts DESC, e.event_type DESC, e.id DESC'
+    if start is not None:
+        where.append('e.ts >= ?')
+        params.append(int(start.timestamp()))
+    if end is not None:
+        where.append('e.ts < ?')
+        params.append(int(end.timestamp()))
+
+    base = f'''
+        SELECT e.id, e.timestamp, e.event_type, d.text, e.hash, e.session_id, e.ts, e.extra
+        FROM {table} e LEFT JOIN details_dict d ON d.id = e.details_id
+    '''
+    first_where = ' WHERE ' + ' AND '.join(where) if where else ''
+    next_where = ' WHERE ' + ' AND '.join(where + [keyset])
+
+    cur = cm.get_reader(db_path).cursor()
+    try:
+        cur.execute(f'{base}{first_where} ORDER BY {order} LIMIT ?', params + [batch_size])
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield Event(*row)
+            if len(rows) < batch_size:
+                return
+            last = Event(*rows[-1])
+            if event_type is not None:
+                key = [last.ts, last.id]
+            else:
+                key = [last.ts, last.event_type, last.id]
+            cur.execute(f'{base}{next_where} ORDER BY {order} LIMIT ?', params + key + [batch_size])
+    finally:
+        cur.close()
+
+
 def delete_all_events():
     """Clear all data"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM activity_log')
-        conn.commit()
-        conn.close()
+        with cm.write_transaction() as cursor:
+            if partitions.enabled():
+                partitions.drop_all(cursor)
+            else:
+                cursor.execute('DELETE FROM events')
+            cursor.execute('DELETE FROM details_dict')
+            rollups.reset(cursor)
         return True
     except:
         return False
+
+
+def top_details(event_type, limit=5, db_path=None):
+    """Most frequent details for `event_type` as a list of (text, count).
+
+    Groups on the integer details_id and only looks up the text of the
+    `limit` winners.
+    """
+    cur = cm.get_reader(db_path).cursor()
+    try:
+        source = partitions.source_for_range(cursor=cur)
+        cur.execute(f'''
+            SELECT (SELECT text FROM details_dict WHERE id = g.details_id), g.count
+            FROM (
+                SELECT details_id, COUNT(*) AS count
+                FROM {source}
+                WHERE event_type = ?
+                GROUP BY details_id
+                ORDER BY count DESC
+                LIMIT ?
+            ) g
+            ORDER BY g.count DESC
+        ''', (event_type, limit))
+        return cur.fetchall()
+    finally:
+        cur.close()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Details Dictionary
+Stores each distinct `details` string once and hands out integer ids
+
+Event tables keep only `details_id`; the `activity_log` view joins the text
+back in. Lookups go through an 8-byte hash column so the (possibly long)
+text itself never has to be indexed. The same 64-bit hash is used to store
+the events' dedup `hash` as an INTEGER instead of a 64-char hex string.
+"""
+
+import hashlib
+
+
+def hash64(text):
+    """Signed 64-bit hash of a string (fits an SQLite INTEGER)."""
+    digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def create_table(cursor):
+    """Create the dictionary table if it is missing."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS details_dict (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            hash INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_details_dict_hash ON details_dict(hash)')
+
+
+def intern(cursor, text):
+    """Return the id of `text`, inserting it if it is new."""
+    h = hash64(text)
+    cursor.execute('SELECT id, text FROM details_dict WHERE hash = ?', (h,))
+    for row_id, row_text in cursor.fetchall():
+        # a 64-bit collision is unlikely but possible, compare the text
+        if row_text == text:
+            return row_id
+    cursor.execute('INSERT INTO details_dict (text, hash) VALUES (?, ?)', (text, h))
+    return cursor.lastrowid
+
+
+def prune(cursor, tables):
+    """Delete dictionary entries no event in `tables` refers to; returns the count."""
+    if not tables:
+        cursor.execute('DELETE FROM details_dict')
+        return cursor.rowcount
+    # one NOT IN per table: a single UNION would hit SQLite's compound limit
+    unused = ' AND '.join(f'id NOT IN (SELECT details_id FROM {t})' for t in tables)
+    cursor.execute(f'DELETE FROM details_dict WHERE {unused}')
+    return cursor.rowcount
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Metrics Store
+Resource metrics in fixed-size tiers, round-robin database style
+
+Each tier in config.METRICS_TIERS is a (step, keep) pair and a table
+metrics_<step>s(metric_id, ts, avg, max, count) holding one row per metric
+and step-aligned bucket for `keep` seconds. The first tier is written from
+the samples, every further tier is folded from the one before once its
+buckets are complete, and rows older than `keep` are dropped, so the store
+never grows past (keep / step) rows per metric and tier. Queries read the
+finest tier that still covers the requested time.
+
+Look a value up with `python3 -m database.metrics_store at cpu '2026-10-17 14:00'`.
+"""
+
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+from database import connection_manager as cm
+
+
+def _table(step):
+    return f'metrics_{int(step)}s'
+
+
+def create_tables(cursor):
+    """Create the metric name, state and tier tables if they are missing."""
+    cursor.execute('CREATE TABLE IF NOT EXISTS metric_names (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+    # per tier: every bucket before done_ts has been folded into the next tier
+    cursor.execute('CREATE TABLE IF NOT EXISTS metrics_state (step INTEGER PRIMARY KEY, done_ts INTEGER NOT NULL)')
+    for step, _ in config.METRICS_TIERS:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {_table(step)} (
+                metric_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                avg REAL NOT NULL,
+                max REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (metric_id, ts)
+            ) WITHOUT ROWID
+        ''')
+
+
+_ids = {}  # (db_path, name) -> metric id
+_ids_lock = threading.Lock()
+
+
+def _metric_ids(cursor, names, db_path=None):
+    with _ids_lock:
+        for name in names:
+            if (db_path, name) not in _ids:
+                cursor.execute('INSERT OR IGNORE INTO metric_names (name) VALUES (?)', (name,))
+                cursor.execute('SELECT id FROM metric_names WHERE name = ?', (name,))
+                _ids[(db_path, name)] = cursor.fetchone()[0]
+        return {n: _ids[(db_path, n)] for n in names}
+
+
+def _metric_id(name, db_path=None):
+    with _ids_lock:
+        if (db_path, name) in _ids:
+            return _ids[(db_path, name)]
+    rows = cm.read('SELECT id FROM metric_names WHERE name = ?', (name,), db_path)
+    return rows[0][0] if rows else None
+
+
+def _fold(cursor, source_step, target_step, until):
+    """Fold the complete `target_step` buckets before `until` from the finer tier."""
+    cursor.execute('SELECT done_ts FROM metrics_state WHERE step = ?', (source_step,))
+    row = cursor.fetchone()
+    until = until // target_step * target_step
+    start = row[0] if row else 0
+    if until <= start:
+        return
+    cursor.execute(f'''
+        INSERT INTO {_table(target_step)} (metric_id, ts, avg, max, count)
+        SELECT metric_id, ts / {target_step} * {target_step}, SUM(avg * count) / SUM(count), MAX(max), SUM(count)
+        FROM {_table(source_step)} WHERE ts >= ? AND ts < ? GROUP BY 1, 2
+        ON CONFLICT (metric_id, ts) DO UPDATE SET
+            avg = (avg * count + excluded.avg * excluded.count) / (count + excluded.count),
+            max = MAX(max, excluded.max), count = count + excluded.count
+    ''', (start, until))
+    cursor.execute('INSERT OR REPLACE INTO metrics_state (step, done_ts) VALUES (?, ?)', (source_step, until))
+
+
+def _prune(cursor, now, db_path=None):
+    cursor.execute('SELECT id FROM metric_names')
+    ids = [r[0] for r in cursor.fetchall()]
+    for step, keep in config.METRICS_TIERS:
+        # per metric, so each delete is a primary key range
+        cursor.executemany(f'DELETE FROM {_table(step)} WHERE metric_id = ? AND ts < ?',
+                           [(i, now - keep) for i in ids])
+    # names without rows in any tier (a removed NIC or cgroup) go as well
+    empty = ' AND '.join(f'NOT EXISTS (SELECT 1 FROM {_table(step)} WHERE metric_id = metric_names.id)'
+                         for step, _ in config.METRICS_TIERS)
+    cursor.execute(f'SELECT id, name FROM metric_names WHERE {empty}')
+    gone = cursor.fetchall()
+    if gone:
+        cursor.executemany('DELETE FROM metric_names WHERE id = ?', [(i,) for i, _ in gone])
+        with _ids_lock:
+            for _, name in gone:
+                _ids.pop((db_path, name), None)
+
+
+def write(buckets, db_path=None, until=None):
+    """Store first-tier `buckets` [(name, ts, avg, max, count)], then fold and prune the tiers.
+
+    First-tier buckets before `until` must be complete (default: all but
+    the newest of `buckets`); only those are folded into the next tier.
+    """
+    if not buckets:
+        return
+    now = int(time.time())
+    tiers = config.METRICS_TIERS
+    with cm.write_transaction(db_path) as cur:
+        ids = _metric_ids(cur, {b[0] for b in buckets}, db_path)
+        cur.executemany(f'''
+            INSERT INTO {_table(tiers[0][0])} (metric_id, ts, avg, max, count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (metric_id, ts) DO UPDATE SET
+                avg = (avg * count + excluded.avg * excluded.count) / (count + excluded.count),
+                max = MAX(max, excluded.max), count = count + excluded.count
+        ''', [(ids[name], ts, avg, peak, count) for name, ts, avg, peak, count in buckets])
+        if until is None:
+            # buckets arrive in time order: everything before the newest one is complete
+            until = max(b[1] for b in buckets)
+        for (source, _), (target, _) in zip(tiers, tiers[1:]):
+            _fold(cur, source, target, until)
+            cur.execute('SELECT done_ts FROM metrics_state WHERE step = ?', (source,))
+            row = cur.fetchone()
+            until = row[0] if row else 0
+        _prune(cur, now, db_path)
+
+
+def _tier_for(ts, now=None):
+    now = time.time() if now is None else now
+    for step, keep in config.METRICS_TIERS:
+        if ts >= now - keep:
+            return step
+    return None
+
+
+def query(metric, start_ts, end_ts=None, db_path=None):
+    """(ts, avg, max) rows of `metric` between the two times, from the finest tier covering `start_ts`."""
+    step = _tier_for(start_ts)
+    metric_id = _metric_id(metric, db_path)
+    if step is None or metric_id is None:
+        return []
+    end_ts = time.time() if end_ts is None else end_ts
+    return cm.read(f'SELECT ts, avg, max FROM {_table(step)} WHERE metric_id = ? AND ts >= ? AND ts <= ? ORDER BY ts',
+                   (metric_id, int(start_ts) // step * step, int(end_ts)), db_path)
+
+
+def value_at(metric, ts, db_path=None):
+    """The bucket of `metric` containing `ts` as {'ts', 'avg', 'max', 'step'}, or None.
+
+    Falls back to coarser tiers when the finest one has no bucket there.
+    """
+    metric_id = _metric_id(metric, db_path)
+    if metric_id is None:
+        return None
+    now = time.time()
+    for step, keep in config.METRICS_TIERS:
+        if ts < now - keep:
+            continue
+        rows = cm.read(f'SELECT ts, avg, max FROM {_table(step)} WHERE metric_id = ? AND ts = ?',
+                       (metric_id, int(ts) // step * step), db_path)
+        if rows:
+            return {'ts': rows[0][0], 'avg': rows[0][1], 'max': rows[0][2], 'step': step}
+    return None
+
+
+def metric_names(db_path=None):
+    return [r[0] for r in cm.read('SELECT name FROM metric_names ORDER BY name', (), db_path)]
+
+
+class MetricsRecorder:
+    """Averages samples into first-tier buckets and writes them every `flush()`.
+
+    Several sources may feed it at their own rate (the resource sampler,
+    the cgroup collector). When a sample starts a new bucket every older
+    bucket is closed, also those of metrics missing from it, and a flush
+    only folds the tiers up to the oldest bucket still open.
+    """
+
+    def __init__(self, db_path=None, skip=None):
+        self.db_path = db_path
+        self.step = config.METRICS_TIERS[0][0]
+        pattern = config.METRICS_SKIP if skip is None else skip
+        self._skip = re.compile(pattern) if pattern else None
+        self._open = {}      # name -> [bucket ts, sum, max, count]
+        self._done = []      # finished buckets waiting for flush()
+        self._bucket = 0     # newest bucket seen
+        self._lock = threading.Lock()
+
+    def add(self, ts, values):
+        """Add one sample {metric: value} (a resource sampler listener)."""
+        bucket = int(ts) // self.step * self.step
+        with self._lock:
+            if bucket > self._bucket:
+                # older buckets get no more samples: close them, so a metric
+                # that stopped (removed NIC or cgroup) leaves nothing open
+                self._close(bucket)
+                self._bucket = bucket
+            for name, value in values.items():
+                if self._skip and self._skip.search(name):
+                    continue
+                current = self._open.get(name)
+                if current is not None and current[0] != bucket:
+                    self._done.append((name, current[0], current[1] / current[3], current[2], current[3]))
+                    current = None
+                if current is None:
+                    self._open[name] = [bucket, value, value, 1]
+                else:
+                    current[1] += value
+                    current[2] = max(current[2], value)
+                    current[3] += 1
+
+    def _close(self, before=None):
+        for name, current in list(self._open.items()):
+            if before is None or current[0] < before:
+                self._done.append((name, current[0], current[1] / current[3], current[2], current[3]))
+                del self._open[name]
+
+    def flush(self, final=False):
+        """Write the finished buckets (with `final` the open ones too); returns how many."""
+        with self._lock:
+            if final:
+                self._close()
+            done, self._done = self._done, []
+            # a slow source's bucket may still be open behind faster ones
+            oldest_open = min((c[0] for c in self._open.values()), default=None)
+        if not done:
+            return 0
+        done.sort(key=lambda b: b[1])
+        until = oldest_open if oldest_open is not None else done[-1][1] + self.step
+        try:
+            write(done, self.db_path, until)
+        except Exception as e:
+            print(f"Metrics store error: {e}")
+            return 0
+        return len(done)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'at':
+        print("usage: python3 -m database.metrics_store at METRIC 'YYYY-MM-DD HH:MM[:SS]'")
+        sys.exit(2)
+    when = datetime.fromisoformat(sys.argv[3]).timestamp()
+    found = value_at(sys.argv[2], when)
+    if found is None:
+        print('no data')
+        sys.exit(1)
+    at = datetime.fromtimestamp(found['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{sys.argv[2]} at {at} ({found['step']}s bucket): avg {found['avg']:.2f}, max {found['max']:.2f}")
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Time Partitions
+Optional storage mode that splits events into per-day or per-month tables
+
+With config.PARTITION_MODE set to 'day' or 'month', events are written to
+events_YYYYMMDD / events_YYYYMM tables instead of the single `events`
+table. Either way `activity_log` is a read-only view over the event tables
+(with the details text joined back in), so existing readers keep working.
+Retention drops whole partitions, and range queries use `source_for_range`
+so they only touch the partitions that overlap their window.
+"""
+
+from datetime import datetime, timedelta
+
+import config
+from database import connection_manager as cm
+from database import details_dict
+from database import schema
+
+
+PREFIX = 'events_'
+# SQLite refuses compound SELECTs with more than 500 terms
+_MAX_UNION_TERMS = 400
+
+
+def enabled():
+    """True when events are stored in time partitions."""
+    return config.PARTITION_MODE in ('day', 'month')
+
+
+def partition_name(dt):
+    """Partition table holding events at datetime `dt`."""
+    fmt = '%Y%m%d' if config.PARTITION_MODE == 'day' else '%Y%m'
+    return PREFIX + dt.strftime(fmt)
+
+
+def partition_bounds(name):
+    """Return (start, end) datetimes covered by partition `name`, end exclusive."""
+    key = name[len(PREFIX):]
+    if len(key) == 8:
+        start = datetime.strptime(key, '%Y%m%d')
+        return start, start + timedelta(days=1)
+    start = datetime.strptime(key, '%Y%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def list_partitions(cursor=None):
+    """Names of all partition tables, oldest first."""
+    query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'events_[0-9]*'"
+    if cursor is None:
+        rows = cm.read(query)
+    else:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    # day and month keys sort correctly against each other by start time
+    return sorted((r[0] for r in rows), key=lambda n: partition_bounds(n)[0])
+
+
+def physical_tables(cursor=None):
+    """Tables that actually hold event rows (for DELETE and similar)."""
+    if enabled():
+        return list_partitions(cursor)
+    return ['events']
+
+
+def _union(names):
+    selects = [f'SELECT {schema.EVENT_COLUMNS} FROM {n}' for n in names]
+    if len(selects) <= _MAX_UNION_TERMS:
+        return ' UNION ALL '.join(selects)
+    chunks = []
+    for i in range(0, len(selects), _MAX_UNION_TERMS):
+        part = ' UNION ALL '.join(selects[i:i + _MAX_UNION_TERMS])
+        chunks.append(f'SELECT * FROM ({part})')
+    return ' UNION ALL '.join(chunks)
+
+
+def _empty_source():
+    nulls = ', '.join(f'NULL AS {c.strip()}' for c in schema.EVENT_COLUMNS.split(','))
+    return f'(SELECT {nulls} WHERE 0)'
+
+
+def rebuild_view(cursor):
+    """Recreate the `activity_log` view over the current event tables.
+
+    Returns False (and leaves the view alone) if it already covers them.
+    """
+    names = physical_tables(cursor)
+    if len(names) == 1:
+        source = names[0]
+    elif names:
+        source = f'({_union(names)})'
+    else:
+        source = _empty_source()
+    # LEFT JOIN on the primary key: SQLite drops the join for queries
+    # that never touch `details`
+    sql = f'''
+        CREATE VIEW activity_log AS
+        SELECT e.id AS id, e.timestamp AS timestamp, e.event_type AS event_type,
+               d.text AS details, e.hash AS hash, e.session_id AS session_id, e.ts AS ts,
+               e.extra AS extra
+        FROM {source} e LEFT JOIN details_dict d ON d.id = e.details_id
+    '''
+    # sqlite_master keeps the statement as written; an unchanged view is not
+    # rewritten, so a start next to a running daemon changes no schema
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'activity_log'")
+    row = cursor.fetchone()
+    if row and row[0] == sql.strip():
+        return False
+    cursor.execute('DROP VIEW IF EXISTS activity_log')
+    cursor.execute(sql)
+    return True
+
+
+def _seed_sequence(cursor, name):
+    # ids must keep growing across partitions (retention and readers rely on it)
+    cursor.execute(
+        "SELECT MAX(seq) FROM sqlite_sequence WHERE name = 'events' OR name GLOB 'events_[0-9]*'"
+    )
+    top = cursor.fetchone()[0] or 0
+    cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (name,))
+    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, top))
+
+
+def continue_ids(cursor, name):
+    """Let the next insert into partition `name` get an id above every existing one.
+
+    Needed before inserting into an older partition (back-dated events).
+    """
+    _seed_sequence(cursor, name)
+
+
+def _create_partition(cursor, name):
+    """Create partition `name` if missing; returns True if it was created."""
+    if schema.object_type(cursor, name) is not None:
+        return False
+    schema.create_event_table(cursor, name)
+    _seed_sequence(cursor, name)
+    return True
+
+
+def ensure_partition(cursor, dt):
+    """Return the partition for `dt`, creating it (and refreshing the view) if needed."""
+    name = partition_name(dt)
+    if _create_partition(cursor, name):
+        rebuild_view(cursor)
+    return name
+
+
+def target_table(cursor, dt):
+    """Table new events at `dt` are inserted into."""
+    if enabled():
+        return ensure_partition(cursor, dt)
+    return 'events'
+
+
+def source_for_range(start=None, end=None, cursor=None):
+    """FROM-clause source covering events between `start` and `end` (datetimes, either may be None).
+
+    The source yields raw event rows (`details_id`, not the text). In
+    single-table mode this is simply `events`; with partitions it is a
+    UNION ALL subquery over the overlapping partitions only.
+    """
+    if not enabled():
+        return 'events'
+    names = list_partitions(cursor)
+    picked = []
+    for name in names:
+        p_start, p_end = partition_bounds(name)
+        if start is not None and p_end <= start:
+            continue
+        if end is not None and p_start > end:
+            continue
+        picked.append(name)
+    if not picked:
+        return _empty_source()
+    if len(picked) == 1:
+        return picked[0]
+    return f'({_union(picked)})'
+
+
+def drop_partitions_before(cursor, cutoff, on_drop=None):
+    """Drop partitions that end at or before `cutoff`; returns the dropped names.
+
+    `on_drop(cursor, name)` is called just before each partition is dropped.
+    """
+    current = partition_name(datetime.now())
+    dropped = []
+    for name in list_partitions(cursor):
+        if name != current and partition_bounds(name)[1] <= cutoff:
+            if on_drop:
+                on_drop(cursor, name)
+            cursor.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    if dropped:
+        rebuild_view(cursor)
+    return dropped
+
+
+def drop_all(cursor):
+    """Drop every partition and start again with an empty current one."""
+    for name in list_partitions(cursor):
+        cursor.execute(f'DROP TABLE {name}')
+    ensure_partition(cursor, datetime.now())
+    rebuild_view(cursor)
+
+
+def sync_storage_mode(cursor):
+    """Convert the stored events to the configured mode and create what is missing.
+
+    Switching to partitions splits an existing `events` table into
+    partitions; switching back merges them into a single table again.
+    The `activity_log` view is rebuilt if the set of event tables changed.
+    """
+    details_dict.create_table(cursor)
+    if enabled():
+        if schema.object_type(cursor, 'events') == 'table':
+            _split_table(cursor)
+        ensure_partition(cursor, datetime.now())
+    else:
+        schema.create_event_table(cursor, 'events')
+        if list_partitions(cursor):
+            _merge_partitions(cursor)
+    rebuild_view(cursor)
+
+
+def _split_table(cursor):
+    # partition keys are local dates
+    key_len = 10 if config.PARTITION_MODE == 'day' else 7
+    key_fmt = '%Y-%m-%d' if config.PARTITION_MODE == 'day' else '%Y-%m'
+    cursor.execute('DROP VIEW IF EXISTS activity_log')
+    cursor.execute(f"SELECT DISTINCT substr(date(ts, 'unixepoch', 'localtime'), 1, {key_len}) FROM events")
+    keys = [r[0] for r in cursor.fetchall()]
+    for key in keys:
+        start = datetime.strptime(key, key_fmt)
+        name = partition_name(start)
+        _create_partition(cursor, name)
+        _, end = partition_bounds(name)
+        cursor.execute(
+            f'INSERT INTO {name} ({schema.EVENT_COLUMNS}) SELECT {schema.EVENT_COLUMNS} FROM events '
+            'WHERE ts >= ? AND ts < ?',
+            (int(start.timestamp()), int(end.timestamp()))
+        )
+    cursor.execute('DROP TABLE events')
+
+
+def _merge_partitions(cursor):
+    names = list_partitions(cursor)
+    cursor.execute('DROP VIEW IF EXISTS activity_log')
+    for name in names:
+        cursor.execute(
+            f'INSERT INTO events ({schema.EVENT_COLUMNS}) SELECT {schema.EVENT_COLUMNS} FROM {name}'
+        )
+        cursor.execute(f'DROP TABLE {name}')
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Retention Engine
+Deletes old events per event_type on its own schedule
+
+Each event_type gets an age policy (`max_age_days`) and/or a size policy
+(`max_rows`) from config.RETENTION_POLICIES ('*' is the fallback). Rows are
+removed in small id-range batches, each in its own transaction, so writers
+are never blocked for long, and freed pages are returned to the OS with
+incremental vacuum. With time partitions enabled, partitions older than the
+longest age policy are dropped whole before any row is deleted.
+"""
+
+from datetime import datetime, timedelta
+
+import config
+from auto_updater import AutoUpdater
+from database import connection_manager as cm
+from database import details_dict
+from database import partitions
+from database import rollups
+
+
+def get_policy(event_type):
+    """Return the retention policy dict for `event_type`."""
+    policies = config.RETENTION_POLICIES
+    return policies.get(event_type, policies.get('*', {}))
+
+
+def _age_boundary(max_age_days):
+    """Return (cutoff_ts, highest id of an event older than the cutoff or None)."""
+    cutoff = int((datetime.now() - timedelta(days=max_age_days)).timestamp())
+    # back-dated events (e.g. bash history times) can have ids above newer events
+    source = partitions.source_for_range(None, datetime.fromtimestamp(cutoff))
+    rows = cm.read(f'SELECT MAX(id) FROM {source} WHERE ts < ?', (cutoff,))
+    return cutoff, (rows[0][0] if rows else None)
+
+
+def _size_boundary_id(event_type, max_rows):
+    """Highest id of `event_type` that falls outside the newest `max_rows`, or None."""
+    rows = cm.read(
+        f'SELECT id FROM {partitions.source_for_range()} WHERE event_type = ? ORDER BY id DESC LIMIT 1 OFFSET ?',
+        (event_type, max_rows)
+    )
+    return rows[0][0] if rows else None
+
+
+def _delete_up_to(event_type, boundary_id, batch_size, size_boundary=None, cutoff_ts=None):
+    """Delete rows of `event_type` up to id `boundary_id`, one id range per transaction.
+
+    A row in range goes if its id is <= `size_boundary` or its ts < `cutoff_ts`.
+    """
+    keep = (size_boundary or 0, -1 if cutoff_ts is None else cutoff_ts)
+    deleted = 0
+    for table in partitions.physical_tables():
+        rows = cm.read(f'SELECT MIN(id) FROM {table} WHERE event_type = ?', (event_type,))
+        low = rows[0][0] if rows else None
+        while low is not None and low <= boundary_id:
+            high = min(low + batch_size - 1, boundary_id)
+            with cm.write_transaction() as cur:
+                where = 'id BETWEEN ? AND ? AND event_type = ? AND (id <= ? OR ts < ?)'
+                params = (low, high, event_type) + keep
+                rollups.forget(cur, table, where, params)
+                cur.execute(f'DELETE FROM {table} WHERE {where}', params)
+                deleted += cur.rowcount
+            # jump over id gaps left by other event types
+            rows = cm.read(f'SELECT MIN(id) FROM {table} WHERE event_type = ? AND id > ?', (event_type, high))
+            low = rows[0][0] if rows else None
+    return deleted
+
+
+def _drop_expired_partitions():
+    """Drop partitions older than every age policy; returns the dropped names."""
+    ages = [p.get('max_age_days') for p in config.RETENTION_POLICIES.values()]
+    if not ages or not all(ages):
+        # some event type is kept forever, whole partitions can't go
+        return []
+    cutoff = datetime.now() - timedelta(days=max(ages))
+    with cm.write_transaction() as cur:
+        return partitions.drop_partitions_before(
+            cur, cutoff, on_drop=lambda c, name: rollups.forget(c, name, '1'))
+
+
+def apply_retention(batch_size=None, vacuum_pages=None):
+    """Apply all retention policies once.
+
+    Returns a dict {event_type: deleted_rows} for the types that lost rows;
+    dropped partitions are listed under the 'partitions' key.
+    """
+    batch_size = batch_size or config.RETENTION_BATCH_SIZE
+    vacuum_pages = config.RETENTION_VACUUM_PAGES if vacuum_pages is None else vacuum_pages
+    result = {}
+    try:
+        if partitions.enabled():
+            dropped = _drop_expired_partitions()
+            if dropped:
+                result['partitions'] = dropped
+
+        event_types = [r[0] for r in cm.read(f'SELECT DISTINCT event_type FROM {partitions.source_for_range()}')]
+        age_boundaries = {}
+        for event_type in event_types:
+            policy = get_policy(event_type)
+            cutoff_ts = age_boundary = size_boundary = None
+
+            max_age = policy.get('max_age_days')
+            if max_age:
+                if max_age not in age_boundaries:
+                    age_boundaries[max_age] = _age_boundary(max_age)
+                cutoff_ts, age_boundary = age_boundaries[max_age]
+
+            max_rows = policy.get('max_rows')
+            if max_rows:
+                size_boundary = _size_boundary_id(event_type, max_rows)
+
+            boundary = max(b for b in (age_boundary, size_boundary, 0) if b is not None)
+            if boundary:
+                deleted = _delete_up_to(event_type, boundary, batch_size, size_boundary, cutoff_ts)
+                if deleted:
+                    result[event_type] = deleted
+
+        if result:
+            # drop dictionary strings no remaining event refers to
+            with cm.write_transaction() as cur:
+                details_dict.prune(cur, partitions.physical_tables(cur))
+            if vacuum_pages:
+                incremental_vacuum(vacuum_pages)
+    except Exception as e:
+        print(f"Retention error: {e}")
+    return result
+
+
+def incremental_vacuum(pages):
+    """Give up to `pages` free pages back to the file system."""
+    with cm.writer_connection() as conn:
+        # execute() stops after the first step (one page); executescript
+        # runs the pragma to completion
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+
+
+def start_scheduler(interval_seconds=None):
+    """Run `apply_retention` periodically on a daemon thread; returns the AutoUpdater."""
+    updater = AutoUpdater(interval_seconds or config.RETENTION_INTERVAL_SECONDS, apply_retention)
+    updater.start()
+    return updater
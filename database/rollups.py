@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Rollups
+Hourly and daily aggregates kept current from a high-water event id
+
+  rollup_hourly(hour, event_type, count)            - events per UTC epoch hour
+  rollup_daily(day, event_type, details_id, count)  - per local day, for the
+                                                       types in DETAIL_TYPES
+
+`refresh()` folds in only the events with an id above the stored mark
+(event ids grow monotonically, also across partitions). Retention subtracts
+what it deletes, so the rollups always match the raw events. Only writers
+refresh (the collection service every ROLLUP_REFRESH_SECONDS, the dashboard
+once per refresh when it collects itself); the read helpers below never
+take the writer lock. Rebuild from scratch with
+`python3 -m database.rollups rebuild`.
+"""
+
+import sys
+
+from database import connection_manager as cm
+from database import partitions
+
+
+# event types whose details (commands, files) get per-day counts
+DETAIL_TYPES = ('bash_command', 'file_access')
+
+
+def create_tables(cursor):
+    """Create the rollup tables if they are missing."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_hourly (
+            hour INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (hour, event_type)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_daily (
+            day TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            details_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, event_type, details_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)')
+    cursor.execute("INSERT OR IGNORE INTO rollup_state (name, last_id) VALUES ('events', 0)")
+
+
+def _last_id(cursor):
+    cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'events'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _top_id(cursor):
+    # highest id ever handed out; cheaper than MAX(id) over every partition
+    cursor.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name = 'events' OR name GLOB 'events_[0-9]*'")
+    return cursor.fetchone()[0] or 0
+
+
+def _fold(cursor, source, where, params, sign):
+    """Add (sign=1) or subtract (sign=-1) the counts of the matching events."""
+    cursor.execute(f'''
+        INSERT INTO rollup_hourly (hour, event_type, count)
+        SELECT ts / 3600, event_type, {sign} * COUNT(*) FROM {source}
+        WHERE {where} GROUP BY 1, 2
+        ON CONFLICT (hour, event_type) DO UPDATE SET count = count + excluded.count
+    ''', params)
+    types = ', '.join('?' * len(DETAIL_TYPES))
+    cursor.execute(f'''
+        INSERT INTO rollup_daily (day, event_type, details_id, count)
+        SELECT date(ts, 'unixepoch', 'localtime'), event_type, details_id, {sign} * COUNT(*) FROM {source}
+        WHERE ({where}) AND event_type IN ({types}) GROUP BY 1, 2, 3
+        ON CONFLICT (day, event_type, details_id) DO UPDATE SET count = count + excluded.count
+    ''', tuple(params) + DETAIL_TYPES)
+    if sign < 0:
+        cursor.execute('DELETE FROM rollup_hourly WHERE count <= 0')
+        cursor.execute('DELETE FROM rollup_daily WHERE count <= 0')
+
+
+def refresh(db_path=None):
+    """Fold events newer than the high-water mark into the rollups; returns the new mark."""
+    try:
+        with cm.write_transaction(db_path) as cur:
+            last = _last_id(cur)
+            top = _top_id(cur)
+            if top <= last:
+                return last
+            source = partitions.source_for_range(cursor=cur)
+            _fold(cur, source, 'id > ? AND id <= ?', (last, top), 1)
+            cur.execute("UPDATE rollup_state SET last_id = ? WHERE name = 'events'", (top,))
+            return top
+    except Exception as e:
+        print(f"Rollup refresh error: {e}")
+        return None
+
+
+def forget(cursor, table, where, params=()):
+    """Subtract events of `table` matching `where` that are already rolled up.
+
+    Call inside the transaction that deletes those events.
+    """
+    last = _last_id(cursor)
+    if last:
+        _fold(cursor, table, f'({where}) AND id <= ?', tuple(params) + (last,), -1)
+
+
+def reset(cursor):
+    """Empty the rollups (the events are being deleted as well)."""
+    cursor.execute('DELETE FROM rollup_hourly')
+    cursor.execute('DELETE FROM rollup_daily')
+    cursor.execute("UPDATE rollup_state SET last_id = ? WHERE name = 'events'", (_top_id(cursor),))
+
+
+def rebuild(db_path=None):
+    """Recompute the rollups from all raw events."""
+    with cm.write_transaction(db_path) as cur:
+        create_tables(cur)
+        cur.execute('DELETE FROM rollup_hourly')
+        cur.execute('DELETE FROM rollup_daily')
+        cur.execute("UPDATE rollup_state SET last_id = 0 WHERE name = 'events'")
+    return refresh(db_path)
+
+
+def hourly(start_ts=None, end_ts=None, db_path=None):
+    """Rows (hour, event_type, count) with epoch hours overlapping start_ts..end_ts (end excluded)."""
+    lo = 0 if start_ts is None else start_ts // 3600
+    hi = 2 ** 62 if end_ts is None else -(-end_ts // 3600)
+    return cm.read('SELECT hour, event_type, count FROM rollup_hourly WHERE hour >= ? AND hour < ?',
+                   (lo, hi), db_path)
+
+
+def totals_by_type(db_path=None):
+    """Dict {event_type: count} over all stored events."""
+    rows = cm.read('SELECT event_type, SUM(count) FROM rollup_hourly GROUP BY event_type', (), db_path)
+    return dict(rows)
+
+
+def top_details(event_type, limit=5, db_path=None):
+    """Most frequent details of a DETAIL_TYPES event type as a list of (text, count)."""
+    return cm.read('''
+        SELECT (SELECT text FROM details_dict WHERE id = g.details_id), g.count
+        FROM (
+            SELECT details_id, SUM(count) AS count FROM rollup_daily
+            WHERE event_type = ? GROUP BY details_id ORDER BY count DESC LIMIT ?
+        ) g
+        ORDER BY g.count DESC
+    ''', (event_type, limit), db_path)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        print('usage: python3 -m database.rollups rebuild')
+        sys.exit(2)
+    from database import database_operations as db
+    db.create_database()
+    print(f'Rollups rebuilt up to event id {rebuild()}')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Event Table Schema
+DDL shared by the single events table and the time partitions
+
+Schema versions (PRAGMA user_version):
+  1 - `details` stored as TEXT in every event row (activity_log table)
+  2 - `details` interned in details_dict, events keep `details_id`;
+      the dedup `hash` is stored as a 64-bit INTEGER;
+      `activity_log` is a view that joins the text back in
+  3 - integer epoch column `ts` (UTC seconds) next to the text timestamp,
+      covering (event_type, ts) and (ts, event_type) indexes replace the
+      text timestamp index
+  4 - nullable `extra` column for what describes one event but must not
+      split the `details` counts (e.g. the processes holding an open file)
+"""
+
+from database import details_dict
+
+
+SCHEMA_VERSION = 4
+
+# column order of the physical event tables
+EVENT_COLUMNS = 'id, timestamp, event_type, details_id, hash, session_id, ts, extra'
+
+# SQL expression turning the local-time text timestamp into epoch seconds
+TS_FROM_TIMESTAMP = "CAST(strftime('%s', {col}, 'utc') AS INTEGER)"
+
+
+def index_prefix(table):
+    return f'idx_{table}'
+
+
+def create_event_table(cursor, table):
+    """Create an event table named `table` (if missing) with all columns and indexes."""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            details_id INTEGER NOT NULL REFERENCES details_dict(id),
+            hash INTEGER,
+            session_id TEXT,
+            ts INTEGER NOT NULL DEFAULT 0,
+            extra TEXT
+        )
+    ''')
+    create_event_indexes(cursor, table)
+
+
+def create_event_indexes(cursor, table):
+    prefix = index_prefix(table)
+    # covers COUNT per type and the top-N GROUP BY details_id
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_type_details ON {table}(event_type, details_id)')
+    # covering indexes for per-type time windows and plain time windows
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_type_ts ON {table}(event_type, ts)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_ts_type ON {table}(ts, event_type)')
+    # dedup lookups: hash within a recent window
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_hash_ts ON {table}(hash, ts)')
+
+
+def object_type(cursor, name):
+    """Return 'table', 'view' or None for a schema object."""
+    cursor.execute('SELECT type FROM sqlite_master WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [r[1] for r in cursor.fetchall()]
+
+
+def _event_tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND (name = 'events' OR name GLOB 'events_[0-9]*')")
+    return [r[0] for r in cursor.fetchall()]
+
+
+def upgrade(cursor):
+    """Bring an older database up to SCHEMA_VERSION (runs inside create_database).
+
+    Returns True if existing data was rewritten (worth a vacuum afterwards).
+    """
+    details_dict.create_table(cursor)
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return False
+
+    migrated = False
+    if version < 2:
+        migrated = _upgrade_to_v2(cursor) or migrated
+    if version < 3:
+        migrated = _upgrade_to_v3(cursor) or migrated
+    if version < 4:
+        _upgrade_to_v4(cursor)
+
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return migrated
+
+
+def _upgrade_to_v4(cursor):
+    # a new nullable column is a schema-only change, no rows are rewritten
+    for table in _event_tables(cursor):
+        if 'extra' not in _columns(cursor, table):
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN extra TEXT')
+
+
+def _upgrade_to_v3(cursor):
+    changed = False
+    for table in _event_tables(cursor):
+        if 'ts' not in _columns(cursor, table):
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN ts INTEGER NOT NULL DEFAULT 0')
+            cursor.execute(f'UPDATE {table} SET ts = {TS_FROM_TIMESTAMP.format(col="timestamp")}')
+            changed = True
+        for suffix in ('timestamp', 'hash'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index_prefix(table)}_{suffix}')
+        create_event_indexes(cursor, table)
+    return changed
+
+
+def _upgrade_to_v2(cursor):
+    # v1 tables: the original activity_log table and v1 time partitions
+    v1_tables = []
+    if object_type(cursor, 'activity_log') == 'table':
+        v1_tables.append(('activity_log', 'events'))
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'events_[0-9]*'")
+    for (name,) in cursor.fetchall():
+        if 'details' in _columns(cursor, name):
+            v1_tables.append((name, name))
+
+    if v1_tables:
+        # the v1 partition view points at tables we are about to replace
+        if object_type(cursor, 'activity_log') == 'view':
+            cursor.execute('DROP VIEW activity_log')
+        cursor.connection.create_function('hash64', 1, _hash64_or_none, deterministic=True)
+        # temporary text index so the copy can join on the text
+        cursor.execute('CREATE INDEX IF NOT EXISTS tmp_details_dict_text ON details_dict(text)')
+        for old, new in v1_tables:
+            _upgrade_v1_table(cursor, old, new)
+        cursor.execute('DROP INDEX tmp_details_dict_text')
+
+    return bool(v1_tables)
+
+
+def _hash64_or_none(text):
+    return None if text is None else details_dict.hash64(text)
+
+
+def _upgrade_v1_table(cursor, old, new):
+    cursor.execute(f'''
+        INSERT INTO details_dict (text, hash)
+        SELECT DISTINCT o.details, hash64(o.details) FROM {old} o
+        WHERE NOT EXISTS (SELECT 1 FROM details_dict d WHERE d.text = o.details)
+    ''')
+    if old == new:
+        # rebuilding in place: move the v1 table out of the way first
+        source = f'v1_{old}'
+        cursor.execute(f'ALTER TABLE {old} RENAME TO {source}')
+        for suffix in ('timestamp', 'event_type', 'hash'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index_prefix(old)}_{suffix}')
+    else:
+        source = old
+    create_event_table(cursor, new)
+    cursor.execute(f'''
+        INSERT INTO {new} (id, timestamp, event_type, details_id, hash, session_id, ts)
+        SELECT o.id, o.timestamp, o.event_type, d.id, hash64(o.hash), o.session_id,
+               {TS_FROM_TIMESTAMP.format(col="o.timestamp")}
+        FROM {source} o JOIN details_dict d ON d.text = o.details
+    ''')
+    cursor.execute(f'DROP TABLE {source}')
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Queue
+Collectors enqueue events in memory, one writer thread persists them
+
+The queue is bounded (config.WRITE_QUEUE_MAX_EVENTS). When it is full,
+`submit` blocks for up to config.WRITE_PUT_TIMEOUT seconds (backpressure)
+and then drops what still does not fit. The writer flushes everything
+pending in one `save_events` transaction once config.WRITE_FLUSH_EVENTS
+events are waiting or the oldest one has waited config.WRITE_FLUSH_SECONDS.
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+
+import config
+from database import database_operations as db
+
+
+class WriteBehindQueue:
+    def __init__(self, save_function=None, max_events=None, flush_events=None,
+                 flush_seconds=None, put_timeout=None):
+        self.save_function = save_function or db.save_events
+        self.max_events = max_events or config.WRITE_QUEUE_MAX_EVENTS
+        self.flush_events = flush_events or config.WRITE_FLUSH_EVENTS
+        self.flush_seconds = config.WRITE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.put_timeout = config.WRITE_PUT_TIMEOUT if put_timeout is None else put_timeout
+
+        self._pending = deque()
+        self._oldest = None  # monotonic time the oldest pending event arrived
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._flush_callbacks = []
+        self._flushing = False
+        self._running = False
+        self._thread = None
+
+        self._stats = {
+            'enqueued': 0, 'written': 0, 'skipped': 0, 'dropped': 0,
+            'flushes': 0, 'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0,
+        }
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        """Queue a batch of event dicts (same format as save_events).
+
+        Events are stamped with the current time if they carry no `ts`, so a
+        delayed flush does not shift them. Returns (queued, dropped).
+        """
+        now = int(time.time())
+        deadline = time.monotonic() + self.put_timeout
+        queued = 0
+        with self._cond:
+            for event in batch:
+                while len(self._pending) >= self.max_events:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._running:
+                        dropped = len(batch) - queued
+                        self._stats['enqueued'] += queued
+                        self._stats['dropped'] += dropped
+                        return queued, dropped
+                    # wake the writer and wait for room
+                    self._flush_requested = True
+                    self._cond.notify_all()
+                    self._cond.wait(remaining)
+                if 'ts' not in event:
+                    event = dict(event, ts=now)
+                if not self._pending:
+                    self._oldest = time.monotonic()
+                self._pending.append(event)
+                queued += 1
+            self._stats['enqueued'] += queued
+            if len(self._pending) >= self.flush_events:
+                self._cond.notify_all()
+        return queued, 0
+
+    def request_flush(self, callback=None):
+        """Ask the writer to flush now without waiting; `callback` runs after that flush."""
+        with self._cond:
+            if callback:
+                self._flush_callbacks.append(callback)
+            self._flush_requested = True
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Flush now and wait until the queue is empty; returns True if it drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._flushing:
+                if not self._running:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        if self._pending:
+            # writer is not running: flush on the caller's thread
+            self._flush_once()
+        return not self._pending
+
+    def stop(self, timeout=10):
+        """Flush what is pending and stop the writer thread (shutdown hook)."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Counters: queue depth, events enqueued/written/skipped/dropped and flush latency (ms)."""
+        with self._cond:
+            s = dict(self._stats)
+            s['depth'] = len(self._pending)
+        s['avg_flush_ms'] = round(s.pop('total_flush_ms') / s['flushes'], 2) if s['flushes'] else 0.0
+        return s
+
+    def _due(self):
+        if not self._pending:
+            return False
+        if self._flush_requested or len(self._pending) >= self.flush_events:
+            return True
+        return time.monotonic() - self._oldest >= self.flush_seconds
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._due():
+                    if self._flush_requested and not self._pending:
+                        # nothing to write, still answer the flush request
+                        break
+                    wait = None
+                    if self._pending:
+                        wait = max(0.0, self.flush_seconds - (time.monotonic() - self._oldest))
+                    self._cond.wait(wait)
+                if not self._running and not self._pending:
+                    self._run_callbacks()
+                    return
+            self._flush_once()
+
+    def _flush_once(self):
+        with self._cond:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._oldest = None
+            self._flush_requested = False
+            self._flushing = True
+        try:
+            if batch:
+                start = time.perf_counter()
+                inserted, skipped = self.save_function(batch)
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                with self._cond:
+                    self._stats['written'] += inserted
+                    self._stats['skipped'] += skipped
+                    self._stats['flushes'] += 1
+                    self._stats['last_flush_ms'] = round(elapsed_ms, 2)
+                    self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 2)
+                    self._stats['total_flush_ms'] += elapsed_ms
+        except Exception as e:
+            print(f"Write-behind flush error: {e}")
+        finally:
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+            self._run_callbacks()
+
+    def _run_callbacks(self):
+        with self._cond:
+            callbacks = self._flush_callbacks
+            self._flush_callbacks = []
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception:
+                pass
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_queue():
+    """Return the shared, started write-behind queue (flushed at interpreter exit)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = WriteBehindQueue()
+            _default.start()
+            atexit.register(_default.stop)
+        return _default
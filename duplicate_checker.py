@@ -5,7 +5,9 @@ Generates a hash for an event and checks database for recent duplicates.
 """
 
 import hashlib
-from database import database_operations as db
+import time
+from database import connection_manager as cm
+from database import details_dict
 
 
 def make_hash(event_type, details):
@@ -17,14 +19,9 @@ def make_hash(event_type, details):
 def is_recent_duplicate(hash_value, minutes=5):
     """Return True if a record with `hash_value` exists within the last `minutes` minutes."""
     try:
-        # reuse save_event duplicate logic indirectly by querying DB
-        conn = __import__('sqlite3').connect(db.DB_FILE)
-        cur = conn.cursor()
-        from datetime import datetime, timedelta
-        window_start = (datetime.now() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
-        cur.execute('SELECT id FROM activity_log WHERE hash = ? AND timestamp >= ?', (hash_value, window_start))
-        exists = cur.fetchone() is not None
-        conn.close()
-        return exists
+        window_start = int(time.time()) - minutes * 60
+        rows = cm.read('SELECT id FROM activity_log WHERE hash = ? AND ts >= ? LIMIT 1',
+                       (details_dict.hash64(hash_value), window_start))
+        return bool(rows)
     except Exception:
         return False
@@ -10,11 +10,8 @@ import threading
 import time
 from datetime import datetime
 
-import database.database_operations as db
-import collectors_mainpulations.bash_history_collector as bash_collector
-import collectors_mainpulations.process_collector as proc_collector
-import collectors_mainpulations.user_collector as user_collector
-import collectors_mainpulations.file_collector as file_collector
+from database import write_behind
+import collection_daemon
 import statistics_export.statistics_calculator as stats
 import statistics_export.csv_exporter as exporter
 
@@ -26,6 +23,7 @@ from gui import (
     gui_activity_log,
     gui_files_table,
     gui_system_panel,
+    gui_top_processes,
     gui_analytics_panel
 )
 from data_analyzer import DataAnalyzer
@@ -43,6 +41,17 @@ class Dashboard:
         self.root.configure(bg=LIGHT)
         
         self.auto_running = False
+        self.collecting = False
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # with a collection daemon running the window only reads the database;
+        # otherwise it runs the capture itself, the collectors on "Start Auto",
+        # handing events to the write-behind queue instead of the DB
+        self.daemon_pid = collection_daemon.running_pid()
+        self.service = None
+        if not self.daemon_pid:
+            self.service = collection_daemon.CollectionService(write_behind.get_queue())
+            self.service.start(schedule=False)
         
         # Create a scrollable content area so the UI fits smaller screens
         header_frame, header_labels = gui_header.create_header(self.root)
@@ -81,6 +90,8 @@ class Dashboard:
         self.stats_vars = gui_stats_cards.create_stats_cards(scrollable_frame)
         # System resources panel (below the stats cards)
         self.system_panel = gui_system_panel.create_system_panel(scrollable_frame)
+        # heaviest processes right now (CPU, memory, disk I/O)
+        self.top_processes = gui_top_processes.create_top_processes(scrollable_frame)
         self.commands_table = gui_commands_table.create_commands_table(scrollable_frame)
         self.files_table = gui_files_table.create_files_table(scrollable_frame)
 
@@ -91,6 +102,7 @@ class Dashboard:
         self.new_items_list = tk.Listbox(self.new_items_frame, height=6)
         self.new_items_list.pack(fill='x')
         self.last_scan_time = datetime.now()
+        self.scanning_new_items = False
 
         # Receive auto, refresh, analytics buttons
         self.auto_btn, self.refresh_btn, self.analytics_btn = gui_control_buttons.create_control_buttons(
@@ -103,6 +115,8 @@ class Dashboard:
         )
 
         self.log = gui_activity_log.create_activity_log(scrollable_frame)
+        if self.daemon_pid:
+            self.log_msg(f"🛰️ Collection daemon running (pid {self.daemon_pid}), read-only view")
         
         # Initial refresh
         self.refresh_view()
@@ -115,19 +129,37 @@ class Dashboard:
     
     def collect_now(self):
         """Collect data button"""
+        if not self.service:
+            # the daemon collects on its own schedule
+            self.refresh_view()
+            return
+        if self.collecting:
+            return
+        self.collecting = True
         self.log_msg("🔄 Collecting data...")
+        # all collectors at once, each waited for up to its timeout: not on the Tk thread
+        threading.Thread(target=self._collect_worker, daemon=True).start()
+    
+    def _collect_worker(self):
+        """Background part of collect_now, results are posted back to the Tk thread"""
         try:
-            bash_collector.collect_and_save(db.save_event, MAX_BASH_COMMANDS)
-            proc_collector.collect_and_save(db.save_event, MAX_PROCESSES)
-            user_collector.collect_and_save(db.save_event)
-            file_collector.collect_and_save(db.save_event, MAX_FILES)  # ← جديد
-            
-            self.log_msg("✅ Data collected")
-            self.refresh_view()
-            messagebox.showinfo("Success", "Data collected!")
+            results = self.service.collectors.run_now()
         except Exception as e:
-            self.log_msg(f"❌ Error: {e}")
-            messagebox.showerror("Error", str(e))
+            self.root.after(0, self._collect_done, None, e)
+            return
+        self.root.after(0, self._collect_done, results, None)
+    
+    def _collect_done(self, results, error):
+        self.collecting = False
+        if error is not None:
+            self.log_msg(f"❌ Error: {error}")
+            messagebox.showerror("Error", str(error))
+            return
+        counts = ', '.join(f"{name}: {'-' if n is None else n}" for name, n in results.items())
+        self.log_msg(f"✅ Data collected ({counts})")
+        # refresh once the queued events are on disk and rolled up
+        self.service.request_flush(lambda: self.root.after(0, self.refresh_view))
+        messagebox.showinfo("Success", "Data collected!")
     
     def refresh_view(self):
         """Refresh display"""
@@ -170,26 +202,43 @@ class Dashboard:
             except Exception:
                 pass
 
-            # update new items list (files/folders created since last scan)
-            try:
-                from new_items_detector import find_new_items
-                new = find_new_items(self.last_scan_time, max_items=50)
-                self.new_items_list.delete(0, 'end')
-                for it in new:
-                    ts = it['ctime'].strftime('%H:%M') if it.get('ctime') else '--'
-                    name = it['path'].split('/')[-1]
-                    self.new_items_list.insert('end', f"{name} ({ts})")
-                self.last_scan_time = datetime.now()
-            except Exception:
-                pass
+            # update new items list (files/folders created since last scan),
+            # scanned off the Tk thread
+            if not self.scanning_new_items:
+                self.scanning_new_items = True
+                threading.Thread(target=self._scan_new_items, daemon=True).start()
         except Exception as e:
             self.log_msg(f"❌ Error: {e}")
     
+    def _scan_new_items(self):
+        """Background part of refresh_view: incremental scan for new files/folders"""
+        try:
+            from new_items_detector import find_new_items
+            since = self.last_scan_time
+            self.last_scan_time = datetime.now()
+            new = find_new_items(since, max_items=50)
+        except Exception:
+            new = []
+        self.root.after(0, self._show_new_items, new)
+    
+    def _show_new_items(self, new):
+        self.scanning_new_items = False
+        try:
+            self.new_items_list.delete(0, 'end')
+            for it in new:
+                ts = it['ctime'].strftime('%H:%M') if it.get('ctime') else '--'
+                name = it['path'].split('/')[-1]
+                self.new_items_list.insert('end', f"{name} ({ts})")
+        except Exception:
+            pass
+    
     def toggle_auto(self):
         """Toggle auto update"""
         if not self.auto_running:
             self.auto_running = True
             self.auto_btn.config(text="⏸️ Stop Auto", bg=RED)
+            if self.service:
+                self.service.collectors.start()
             threading.Thread(target=self._auto_loop, daemon=True).start()
             # Disable manual refresh while auto updates are running
             try:
@@ -199,6 +248,8 @@ class Dashboard:
             self.log_msg(f"▶️ Auto started ({AUTO_UPDATE_SECONDS}s)")
         else:
             self.auto_running = False
+            if self.service:
+                self.service.collectors.stop(timeout=0)
             self.auto_btn.config(text="▶️ Start Auto", bg=ORANGE)
             # Re-enable manual refresh
             try:
@@ -231,17 +282,25 @@ class Dashboard:
             self.log_msg(f"❌ Analytics error: {e}")
     
     def _auto_loop(self):
-        """Auto update loop"""
+        """Auto update loop: the scheduler collects, this refreshes the view"""
         while self.auto_running:
             try:
-                bash_collector.collect_and_save(db.save_event, MAX_BASH_COMMANDS)
-                proc_collector.collect_and_save(db.save_event, MAX_PROCESSES)
-                file_collector.collect_and_save(db.save_event, MAX_FILES)  # ← جديد
-                self.root.after(0, self.refresh_view)
+                if self.service:
+                    self.service.request_flush(lambda: self.root.after(0, self.refresh_view))
+                else:
+                    # the daemon writes and rolls up on its own schedule
+                    self.root.after(0, self.refresh_view)
                 time.sleep(AUTO_UPDATE_SECONDS)
             except:
                 pass
     
+    def on_close(self):
+        """Flush queued events, then close the window"""
+        self.auto_running = False
+        if self.service:
+            self.service.stop(timeout=0)
+        self.root.destroy()
+    
     def export_csv(self):
         """Export to CSV"""
         try:
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 GUI System Resources Panel
-Displays CPU, RAM, Disk and Network I/O using progress bars and updates in background.
+Displays CPU, RAM, Disk, Network and Disk I/O rates using progress bars and updates in background.
 """
 
 import tkinter as tk
@@ -9,7 +9,15 @@ from tkinter import ttk
 import threading
 import time
 from config import LIGHT, DARK
-import system_resources_monitor as srm
+import resource_sampler
+
+
+def _rate(bytes_per_s):
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bytes_per_s < 1024:
+            return f"{bytes_per_s:.1f} {unit}"
+        bytes_per_s /= 1024.0
+    return f"{bytes_per_s:.1f} GB/s"
 
 
 def create_system_panel(parent, update_interval_ms=2000, disk_path='/'):
@@ -49,6 +57,7 @@ def create_system_panel(parent, update_interval_ms=2000, disk_path='/'):
     ram_row = make_row(2, '🧠 RAM')
     disk_row = make_row(3, '💾 Disk')
     net_row = make_row(4, '📡 Network')
+    io_row = make_row(5, '⚙️ Disk I/O')
 
     # allow the middle column (bars) to expand
     panel.grid_columnconfigure(1, weight=1)
@@ -87,11 +96,14 @@ def create_system_panel(parent, update_interval_ms=2000, disk_path='/'):
                 ram_row['bar'].configure(value=0)
                 disk_row['bar'].configure(value=0)
                 net_row['value'].config(text='N/A')
+                io_row['value'].config(text='N/A')
                 return
 
             cpu_pct = data.get('cpu', {}).get('percent', 0) or 0
             cpu_row['bar'].configure(value=cpu_pct)
-            cpu_row['value'].config(text=f"{cpu_pct}%")
+            recent = [v for _, v in sampler.history('cpu', 60)]
+            avg = f" (1m avg {sum(recent) / len(recent):.1f}%)" if recent else ''
+            cpu_row['value'].config(text=f"{cpu_pct}%{avg}")
 
             mem = data.get('memory', {})
             mem_pct = mem.get('percent', 0) or 0
@@ -110,18 +122,35 @@ def create_system_panel(parent, update_interval_ms=2000, disk_path='/'):
             disk_row['value'].config(text=f"{disk_pct}% ({disk.get('used_gb',0)}/{disk.get('total_gb',0)} GB)")
 
             net = data.get('network', {})
-            sent = net.get('sent_mb', 0)
-            recv = net.get('recv_mb', 0)
-            net_row['value'].config(text=f"Sent: {sent} MB / Recv: {recv} MB")
+            if 'sent_per_s' in net:
+                # busiest interface first
+                nics = sorted(net.get('interfaces', {}).items(), key=lambda n: -(n[1]['rx_bps'] + n[1]['tx_bps']))
+                busiest = f" ({nics[0][0]})" if len(nics) > 1 else ''
+                net_row['value'].config(text=f"↑ {_rate(net['sent_per_s'])} / ↓ {_rate(net['recv_per_s'])}{busiest}")
+            else:
+                net_row['value'].config(text=f"Sent: {net.get('sent_mb', 0)} MB / Recv: {net.get('recv_mb', 0)} MB")
+
+            disks = data.get('disk_io', {})
+            if disks:
+                read = sum(d['read_bps'] for d in disks.values())
+                write = sum(d['write_bps'] for d in disks.values())
+                iops = sum(d['read_iops'] + d['write_iops'] for d in disks.values())
+                # the bar shows the busiest device
+                name, busiest = max(disks.items(), key=lambda d: d[1]['util'])
+                io_row['bar'].configure(value=busiest['util'])
+                io_row['value'].config(text=f"R {_rate(read)} / W {_rate(write)}, {iops:.0f} IOPS, "
+                                            f"{name} {busiest['util']:.0f}% busy, {busiest['await_ms']:.1f} ms")
         except Exception:
             # swallow UI update errors
             pass
 
-    # Background worker that polls psutil and updates the UI
+    # the shared sampler reads psutil; this worker only picks up its latest values
+    sampler = resource_sampler.get_sampler(disk_path)
+
     def worker():
         while running:
             try:
-                data = srm.get_all(disk_path)
+                data = sampler.latest()
                 # schedule UI update on main thread
                 parent.after(0, lambda d=data: update_ui(d))
             except Exception:
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+GUI Top Processes
+Leaderboard of the processes using the most CPU, memory or disk I/O
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from config import LIGHT
+import resource_sampler
+import system_resources_monitor as srm
+
+
+def _size(n):
+    if n is None:
+        return '--'
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} GB"
+
+
+def create_top_processes(parent, update_interval_ms=2000, rows=8):
+    """Create the top processes table; the leaderboard is ticked by the resource sampler.
+
+    Returns a dict with keys:
+      - 'frame': the container frame
+      - 'stop': callable to stop the updates
+    """
+    frame = tk.Frame(parent, bg=LIGHT)
+    frame.pack(fill='x', padx=20, pady=6)
+
+    top_bar = tk.Frame(frame, bg=LIGHT)
+    top_bar.pack(fill='x')
+    tk.Label(top_bar, text="🏆 Top Processes", font=('Arial', 11, 'bold'), bg=LIGHT).pack(side='left')
+    by = tk.StringVar(value='cpu')
+    for value, text in (('io', 'Disk I/O'), ('rss', 'Memory'), ('cpu', 'CPU')):
+        tk.Radiobutton(top_bar, text=text, variable=by, value=value, bg=LIGHT,
+                       command=lambda: refresh()).pack(side='right')
+
+    tree = ttk.Treeview(
+        frame,
+        columns=('PID', 'Command', 'CPU', 'Memory', 'Read', 'Write', 'FDs'),
+        show='headings',
+        height=rows
+    )
+    for column, width in (('PID', 70), ('Command', 330), ('CPU', 60), ('Memory', 80),
+                          ('Read', 80), ('Write', 80), ('FDs', 50)):
+        tree.heading(column, text=column if column not in ('Read', 'Write') else f"{column}/s")
+        tree.column(column, width=width, anchor='w' if column == 'Command' else 'e')
+    tree.pack(fill='x')
+
+    board = srm.get_leaderboard()
+    sampler = resource_sampler.get_sampler()
+    # per-process stats are refreshed on the sampler's thread, not the Tk one
+    sampler.add_listener(lambda ts, values: board.tick())
+
+    running = True
+
+    def refresh():
+        try:
+            for item in tree.get_children():
+                tree.delete(item)
+            for p in board.top(by.get(), rows):
+                command = p['command'] or f"[{p['comm']}]"
+                display = command[:60] + "..." if len(command) > 60 else command
+                tree.insert('', 'end', values=(
+                    p['pid'], display, f"{p['cpu']}%", _size(p['rss']),
+                    _size(p['read_bps']), _size(p['write_bps']), '--' if p['fds'] is None else p['fds']))
+        except Exception:
+            # swallow UI update errors
+            pass
+
+    def schedule():
+        if running:
+            refresh()
+            parent.after(update_interval_ms, schedule)
+
+    schedule()
+
+    def stop():
+        nonlocal running
+        running = False
+
+    return {'frame': frame, 'stop': stop}
@@ -2,19 +2,36 @@
 """
 Activity Monitor - Start Here
 Main entry point
+
+    python3 main.py                  dashboard
+    python3 main.py --daemon         headless collection (see collection_daemon.py)
 """
 
-import tkinter as tk
+import argparse
+import sys
+
 import database.database_operations as db
-from gui.dashboard_main import Dashboard
 
 
 def main():
     """Main function"""
-    # Create database
-    db.create_database()
+    parser = argparse.ArgumentParser(description='Linux Activity Monitor')
+    parser.add_argument('--daemon', action='store_true', help='collect in the background without the GUI')
+    parser.add_argument('--pid-file', help='PID file of the daemon (default: next to the database)')
+    args = parser.parse_args()
+
+    if args.daemon:
+        import collection_daemon
+        sys.exit(collection_daemon.run(args.pid_file))
+
+    # Create database, unless a running daemon owns it (the dashboard then only reads)
+    import collection_daemon
+    if not collection_daemon.running_pid():
+        db.create_database()
     
     # Start GUI
+    import tkinter as tk
+    from gui.dashboard_main import Dashboard
     root = tk.Tk()
     app = Dashboard(root)
     root.mainloop()
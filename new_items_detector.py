@@ -2,11 +2,148 @@
 """
 Detect newly created files and folders since a given timestamp.
 Scans the user's home directory for items with creation time after `since`.
+
+The scan is incremental: an index of every directory's mtime and entry
+names is kept (and saved to config.NEW_ITEMS_INDEX_FILE between runs). A
+directory's mtime only changes when entries are added, removed or renamed
+in it, so a rescan stats each directory once and lists only those whose
+mtime changed; files are stat'ed only when their name is new. Hidden and
+cache directories are skipped.
 """
 
+import json
 import os
+import threading
 from datetime import datetime
 
+import config
+
+
+def _excluded(name):
+    return name.startswith('.') or name in config.WATCH_EXCLUDE_DIRS
+
+
+def _index_path():
+    if config.NEW_ITEMS_INDEX_FILE:
+        return os.path.expanduser(config.NEW_ITEMS_INDEX_FILE)
+    # next to the database by default (the inotify watcher ignores DB_FILE*)
+    return os.path.abspath(config.DB_FILE) + '.new_items.json'
+
+
+class NewItemsScanner:
+    def __init__(self, root, index_file=None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.index_file = index_file or _index_path()
+        self._dirs = None  # path -> [mtime_ns, names, subdirs]
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.index_file) as f:
+                data = json.load(f)
+            if data.get('root') == self.root:
+                return data['dirs']
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self):
+        tmp = self.index_file + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'root': self.root, 'dirs': self._dirs}, f, separators=(',', ':'))
+            os.replace(tmp, self.index_file)
+        except OSError:
+            pass
+
+    def scan(self, since_ts=0):
+        """Walk the tree once; returns items that appeared since the last scan.
+
+        Items are dicts (path, is_dir, ctime) with ctime >= `since_ts`. The
+        very first scan (no saved index) checks every entry's ctime.
+        """
+        with self._lock:
+            if self._dirs is None:
+                self._dirs = self._load()
+            old = self._dirs
+            found = []
+            dirs = {}
+            dirty = False
+            stack = [self.root]
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    dirty = True
+                    continue
+                cached = old.get(path)
+                if cached is not None and cached[0] == mtime:
+                    names, subdirs = cached[1], cached[2]
+                else:
+                    try:
+                        names, subdirs = self._list(path)
+                    except OSError:
+                        continue
+                    # the new mtime is kept either way, but saving the index touches
+                    # its own directory: only a change of names makes it dirty
+                    dirty = dirty or cached is None or cached[1] != names
+                    # only names we haven't seen are new; a directory we never
+                    # listed (first scan, or new) is checked entry by entry
+                    known = set(cached[1]) if cached is not None else None
+                    self._collect(path, names, subdirs, known, since_ts, found)
+                dirs[path] = [mtime, names, subdirs]
+                stack.extend(os.path.join(path, d) for d in subdirs)
+            self._dirs = dirs
+            if dirty or len(dirs) != len(old):
+                self._save()
+            return found
+
+    @staticmethod
+    def _list(path):
+        names, subdirs = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir and _excluded(entry.name):
+                    continue
+                names.append(entry.name)
+                if is_dir:
+                    subdirs.append(entry.name)
+        return names, subdirs
+
+    @staticmethod
+    def _collect(path, names, subdirs, known, since_ts, found):
+        """Append the entries of `path` not in `known` (None: check all by ctime)."""
+        subdir_set = set(subdirs)
+        for name in names:
+            if known is not None and name in known:
+                continue
+            full = os.path.join(path, name)
+            try:
+                ctime = os.lstat(full).st_ctime
+            except OSError:
+                continue
+            if ctime >= since_ts:
+                found.append({'path': full, 'is_dir': name in subdir_set,
+                              'ctime': datetime.fromtimestamp(ctime)})
+
+
+_scanners = {}
+_scanners_lock = threading.Lock()
+
+
+def get_scanner(search_dir=None):
+    """Shared scanner for `search_dir` (default: home)."""
+    root = os.path.abspath(os.path.expanduser('~' if search_dir is None else search_dir))
+    with _scanners_lock:
+        if root not in _scanners:
+            _scanners[root] = NewItemsScanner(root)
+        return _scanners[root]
+
 
 def find_new_items(since_dt, max_items=50, search_dir=None):
     """Return list of new items (path, is_dir, ctime) since `since_dt`.
@@ -14,31 +151,7 @@ def find_new_items(since_dt, max_items=50, search_dir=None):
     `since_dt` should be a datetime.datetime object.
     """
     try:
-        home = os.path.expanduser('~') if search_dir is None else os.path.expanduser(search_dir)
-        results = []
-        since_ts = since_dt.timestamp()
-        for root, dirs, files in os.walk(home):
-            # check dirs
-            for d in dirs:
-                path = os.path.join(root, d)
-                try:
-                    st = os.stat(path)
-                    if st.st_ctime >= since_ts:
-                        results.append({'path': path, 'is_dir': True, 'ctime': datetime.fromtimestamp(st.st_ctime)})
-                        if len(results) >= max_items:
-                            return results
-                except Exception:
-                    continue
-            for f in files:
-                path = os.path.join(root, f)
-                try:
-                    st = os.stat(path)
-                    if st.st_ctime >= since_ts:
-                        results.append({'path': path, 'is_dir': False, 'ctime': datetime.fromtimestamp(st.st_ctime)})
-                        if len(results) >= max_items:
-                            return results
-                except Exception:
-                    continue
-        return results
+        results = get_scanner(search_dir).scan(since_dt.timestamp())
+        return results[:max_items]
     except Exception:
         return []
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Resource Sampler
+One background sampler for CPU, memory, disk and network, with history
+
+Every config.SAMPLER_INTERVAL_SECONDS the sampler reads the counters once
+(nothing blocks: CPU percent and network rates come from the difference to
+the previous tick) and appends the values to fixed-size ring buffers
+holding config.SAMPLER_HISTORY_SECONDS of samples. Consumers read the
+latest values or a window of history instead of polling psutil themselves.
+
+Metrics: 'cpu' and 'cpu.<n>' (percent), 'memory' (percent), 'memory.used'
+(bytes), 'disk' (percent), 'net.sent' and 'net.recv' (bytes/s, without
+loopback), 'net.<nic>.sent' and 'net.<nic>.recv' (bytes/s), and per block
+device 'disk.<dev>.read' / '.write' (bytes/s), '.iops', '.await' (ms per
+request) and '.util' (percent busy).
+"""
+
+import math
+import threading
+import time
+from array import array
+
+import config
+import system_resources_monitor as srm
+
+
+class RingBuffer:
+    """Fixed-size time series: one timestamp array shared by all metrics."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._ts = array('d', [0.0]) * capacity
+        self._values = {}   # metric -> array('d'), NaN where it had no sample
+        self._next = 0      # slot the next sample goes to
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts, values):
+        with self._lock:
+            i = self._next
+            self._ts[i] = ts
+            for metric, value in values.items():
+                column = self._values.get(metric)
+                if column is None:
+                    column = self._values[metric] = array('d', [math.nan]) * self.capacity
+                column[i] = value
+            for metric, column in self._values.items():
+                if metric not in values:
+                    column[i] = math.nan
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._values)
+
+    def window(self, metric, seconds=None):
+        """Samples of `metric` from the last `seconds` (all kept if None), oldest first.
+
+        Returns a list of (ts, value) pairs.
+        """
+        with self._lock:
+            column = self._values.get(metric)
+            if column is None:
+                return []
+            since = None
+            if seconds is not None and self._count:
+                since = self._ts[(self._next - 1) % self.capacity] - seconds
+            out = []
+            # newest first, so a short window stops early
+            for k in range(1, self._count + 1):
+                i = (self._next - k) % self.capacity
+                if since is not None and self._ts[i] < since:
+                    break
+                value = column[i]
+                if value == value:  # skip NaN gaps
+                    out.append((self._ts[i], value))
+            out.reverse()
+            return out
+
+
+class ResourceSampler:
+    def __init__(self, interval=None, history_seconds=None, disk_path='/'):
+        self.interval = interval or config.SAMPLER_INTERVAL_SECONDS
+        history_seconds = history_seconds or config.SAMPLER_HISTORY_SECONDS
+        self.disk_path = disk_path
+        self.ring = RingBuffer(max(1, int(history_seconds / self.interval)))
+        self._prev_cpu = None
+        self._io = srm.IORates()
+        self._latest = None
+        self._sample_lock = threading.Lock()
+        self._listeners = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name='resource-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def add_listener(self, callback):
+        """Call `callback(ts, values)` on the sampler thread after every tick."""
+        self._listeners.append(callback)
+
+    def latest(self):
+        """Last sample in the system_resources_monitor.get_all format (samples once if none yet)."""
+        if self._latest is None:
+            self.sample()
+        return self._latest
+
+    def history(self, metric, window=None):
+        """(ts, value) pairs of `metric` over the last `window` seconds, oldest first."""
+        return self.ring.window(metric, window)
+
+    def _worker(self):
+        next_tick = time.monotonic()
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Resource sampler error: {e}")
+            # fixed rate: a slow tick is not added to the interval
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            time.sleep(delay)
+
+    def sample(self):
+        """Take one sample: update the ring buffers and the latest values."""
+        with self._sample_lock:
+            return self._sample()
+
+    def _sample(self):
+        now = time.time()
+        values = {}
+
+        cores = srm.read_cpu_times()
+        prev = self._prev_cpu
+        self._prev_cpu = cores
+        if prev is None or len(prev) != len(cores):
+            # no previous tick: the average since boot is shown, not recorded
+            overall, per_core = srm.cpu_percent_between([(0.0, 0.0)] * len(cores), cores)
+        else:
+            overall, per_core = srm.cpu_percent_between(prev, cores)
+            values['cpu'] = overall
+            for n, pct in enumerate(per_core):
+                values[f'cpu.{n}'] = pct
+        cpu = {'percent': overall, 'per_core': per_core}
+
+        mem = srm.get_memory()
+        values['memory'] = mem['percent']
+        values['memory.used'] = mem['used']
+        disk = srm.get_disk(self.disk_path)
+        values['disk'] = disk['percent']
+
+        # per-NIC and per-disk rates, one read of /proc/net/dev and /proc/diskstats
+        try:
+            io = self._io.update()
+        except OSError:
+            io = {'network': {}, 'disks': {}, 'counters': {'network': {}, 'disks': {}}, 'elapsed': None}
+        nics = {name: r for name, r in io['network'].items() if name != 'lo'}
+        counters = [c for name, c in io['counters']['network'].items() if name != 'lo']
+        net = {'sent': sum(c[2] for c in counters), 'recv': sum(c[0] for c in counters), 'interfaces': nics}
+        if io['elapsed']:
+            net['sent_per_s'] = values['net.sent'] = sum(r['tx_bps'] for r in nics.values())
+            net['recv_per_s'] = values['net.recv'] = sum(r['rx_bps'] for r in nics.values())
+        for name, r in nics.items():
+            values[f'net.{name}.sent'] = r['tx_bps']
+            values[f'net.{name}.recv'] = r['rx_bps']
+        for name, r in io['disks'].items():
+            values[f'disk.{name}.read'] = r['read_bps']
+            values[f'disk.{name}.write'] = r['write_bps']
+            values[f'disk.{name}.iops'] = r['read_iops'] + r['write_iops']
+            values[f'disk.{name}.await'] = r['await_ms']
+            values[f'disk.{name}.util'] = r['util']
+
+        self.ring.append(now, values)
+        self._latest = srm.with_units(cpu, mem, disk, net)
+        self._latest['disk_io'] = io['disks']
+        for callback in self._listeners:
+            try:
+                callback(now, values)
+            except Exception as e:
+                print(f"Resource sampler listener error: {e}")
+        return values
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_sampler(disk_path='/'):
+    """Return the shared, started sampler (`disk_path` counts on first use only)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResourceSampler(disk_path=disk_path)
+            _default.start()
+        return _default
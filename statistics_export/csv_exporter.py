@@ -5,28 +5,27 @@ Exports data to CSV files only
 """
 
 import csv
-import sqlite3
 from datetime import datetime
-from config import DB_FILE
+from itertools import islice
+from database import database_operations as db
 
 
-def export_to_csv(limit=1000):
-    """Export data to CSV file"""
+def export_to_csv(limit=1000, event_type=None, start=None, end=None):
+    """Export data to CSV file
+
+    Events are streamed from the database, so `limit=None` exports the
+    whole history without loading it into memory.
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(f'SELECT * FROM activity_log ORDER BY timestamp DESC LIMIT {limit}')
-        rows = cursor.fetchall()
+        events = islice(db.iter_events(event_type, start, end), limit)
         
         filename = f'activity_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         
         with open(filename, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['ID', 'Timestamp', 'Event Type', 'Details'])
-            writer.writerows(rows)
+            writer.writerows((e.id, e.timestamp, e.event_type, e.details) for e in events)
         
-        conn.close()
         return filename
     except Exception as e:
         print(f"Export error: {e}")
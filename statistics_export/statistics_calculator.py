@@ -4,55 +4,23 @@ Statistics Calculator
 Calculates statistics from database only
 """
 
-import sqlite3
-from config import DB_FILE
+from database import rollups
 
 
 def calculate_statistics():
     """Calculate all statistics"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Total events
-        cursor.execute('SELECT COUNT(*) FROM activity_log')
-        total_events = cursor.fetchone()[0]
-        
-        # Total commands
-        cursor.execute("SELECT COUNT(*) FROM activity_log WHERE event_type='bash_command'")
-        total_commands = cursor.fetchone()[0]
-        
-        # Total processes
-        cursor.execute("SELECT COUNT(*) FROM activity_log WHERE event_type='running_process'")
-        total_processes = cursor.fetchone()[0]
-        
-        # Total files ← جديد
-        cursor.execute("SELECT COUNT(*) FROM activity_log WHERE event_type='file_access'")
-        total_files = cursor.fetchone()[0]
-        
-        # Top 5 commands
-        cursor.execute('''
-            SELECT details, COUNT(*) as count
-            FROM activity_log
-            WHERE event_type = 'bash_command'
-            GROUP BY details
-            ORDER BY count DESC
-            LIMIT 5
-        ''')
-        top_commands = cursor.fetchall()
-        
-        # Top 5 files 
-        cursor.execute('''
-            SELECT details, COUNT(*) as count
-            FROM activity_log
-            WHERE event_type = 'file_access'
-            GROUP BY details
-            ORDER BY count DESC
-            LIMIT 5
-        ''')
-        top_files = cursor.fetchall()
-        
-        conn.close()
+        # Totals per event type from the hourly rollups
+        totals = rollups.totals_by_type()
+        total_events = sum(totals.values())
+        total_commands = totals.get('bash_command', 0)
+        # snapshots from older versions plus processes seen starting
+        total_processes = totals.get('running_process', 0) + totals.get('process_start', 0)
+        total_files = totals.get('file_access', 0)  # ← جديد
+        
+        # Top 5 commands / files from the daily rollups
+        top_commands = rollups.top_details('bash_command', 5)
+        top_files = rollups.top_details('file_access', 5)
         
         return {
             'total_events': total_events,
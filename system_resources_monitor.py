@@ -1,20 +1,66 @@
 #!/usr/bin/env python3
 """
 System Resources Monitor
-Provides simple psutil-based getters for CPU, memory, disk and network stats.
+Provides simple psutil-based getters for CPU, memory, disk and network stats,
+plus delta-based I/O rates (IORates) and a per-process leaderboard
+(ProcessLeaderboard) read from /proc.
 """
 
+import heapq
+import os
+import resource
+import threading
+import time
+
 import psutil
 
+import config
+from collectors_mainpulations import process_collector as procs
+
+
+def read_cpu_times():
+    """Per-core (busy, total) CPU seconds since boot."""
+    times = []
+    for t in psutil.cpu_times(percpu=True):
+        # guest time is already part of user/nice
+        total = sum(t) - getattr(t, 'guest', 0) - getattr(t, 'guest_nice', 0)
+        times.append((total - t.idle - getattr(t, 'iowait', 0), total))
+    return times
+
+
+def cpu_percent_between(prev, cur):
+    """CPU percent between two read_cpu_times() readings: (overall, [per core])."""
+    per_core = []
+    busy_sum = total_sum = 0.0
+    for (busy0, total0), (busy1, total1) in zip(prev, cur):
+        busy, total = max(0.0, busy1 - busy0), total1 - total0
+        per_core.append(round(100.0 * busy / total, 1) if total > 0 else 0.0)
+        busy_sum += busy
+        total_sum += total
+    overall = round(100.0 * busy_sum / total_sum, 1) if total_sum > 0 else 0.0
+    return overall, per_core
+
+
+_last_cpu = None
+_last_cpu_lock = threading.Lock()
+
 
 def get_cpu():
-    """Return CPU percent (float)."""
+    """Return CPU percent (float) since the previous call, without blocking.
+
+    The first call gives the average since boot.
+    """
+    global _last_cpu
     try:
-        # short interval to get a near-instant value
-        pct = psutil.cpu_percent(interval=0.3)
-        return {'percent': round(pct, 1)}
+        cur = read_cpu_times()
+        with _last_cpu_lock:
+            prev, _last_cpu = _last_cpu, cur
+        if prev is None or len(prev) != len(cur):
+            prev = [(0.0, 0.0)] * len(cur)
+        pct, per_core = cpu_percent_between(prev, cur)
+        return {'percent': pct, 'per_core': per_core}
     except Exception as e:
-        return {'percent': 0.0, 'error': str(e)}
+        return {'percent': 0.0, 'per_core': [], 'error': str(e)}
 
 
 def get_memory():
@@ -52,18 +98,380 @@ def get_network():
         return {'sent': 0, 'recv': 0, 'error': str(e)}
 
 
+def read_net_dev(path='/proc/net/dev'):
+    """Per interface (rx bytes, rx packets, tx bytes, tx packets) since boot."""
+    counters = {}
+    with open(path) as f:
+        for line in f.read().splitlines()[2:]:
+            name, _, fields = line.partition(':')
+            fields = fields.split()
+            if len(fields) >= 10:
+                counters[name.strip()] = (int(fields[0]), int(fields[1]), int(fields[8]), int(fields[9]))
+    return counters
+
+
+def _block_devices():
+    try:
+        return set(os.listdir('/sys/block'))
+    except OSError:
+        return set()
+
+
+def read_diskstats(path='/proc/diskstats', devices=None):
+    """Per block device (reads, sectors read, ms reading, writes, sectors written, ms writing, ms busy).
+
+    With `devices` (e.g. the names in /sys/block) partitions are left out.
+    """
+    counters = {}
+    with open(path) as f:
+        for line in f.read().splitlines():
+            fields = line.split()
+            if len(fields) >= 14 and (devices is None or fields[2] in devices):
+                r, _, rs, rms, w, _, ws, wms, _, busy = (int(x) for x in fields[3:13])
+                counters[fields[2]] = (r, rs, rms, w, ws, wms, busy)
+    return counters
+
+
+def counter_delta(cur, prev):
+    """Increase of a kernel counter, allowing for 32/64-bit wraparound; None after a reset."""
+    if cur >= prev:
+        return cur - prev
+    for bits in (32, 64):
+        if prev < 2 ** bits:
+            delta = cur + 2 ** bits - prev
+            # a real wrap only ever skips a small part of the range
+            return delta if delta < 2 ** (bits - 1) else None
+    return None
+
+
+class IORates:
+    """Per-NIC and per-disk rates from the counter deltas between two `update()` calls."""
+
+    def __init__(self):
+        self._prev = None      # (monotonic, net counters, disk counters)
+        self._devices = _block_devices()
+        self._seen = set()
+
+    def _disk_counters(self):
+        counters = read_diskstats()
+        if not counters.keys() <= self._seen:
+            # a device was added: list /sys/block again
+            self._seen |= counters.keys()
+            self._devices = _block_devices()
+        # whole devices that have done any I/O (not every unused loop device)
+        return {name: c for name, c in counters.items() if name in self._devices and any(c)}
+
+    def update(self):
+        """Read /proc/net/dev and /proc/diskstats once; returns the rates since the last call.
+
+        {'network': {iface: {rx_bps, tx_bps, rx_pps, tx_pps}},
+         'disks': {dev: {read_bps, write_bps, read_iops, write_iops, await_ms, util}},
+         'counters': {'network': ..., 'disks': ...}, 'elapsed': seconds}
+        Rates are empty (elapsed None) on the first call, and missing for
+        counters that were reset.
+        """
+        now = time.monotonic()
+        net = read_net_dev()
+        disks = self._disk_counters()
+        prev, self._prev = self._prev, (now, net, disks)
+        rates = {'network': {}, 'disks': {}, 'counters': {'network': net, 'disks': disks}, 'elapsed': None}
+        if prev is None or now <= prev[0]:
+            return rates
+        elapsed = rates['elapsed'] = now - prev[0]
+
+        for name, cur in net.items():
+            old = prev[1].get(name)
+            if old is None:
+                continue
+            deltas = [counter_delta(c, o) for c, o in zip(cur, old)]
+            if None in deltas:
+                continue
+            rx, rx_packets, tx, tx_packets = (d / elapsed for d in deltas)
+            rates['network'][name] = {'rx_bps': rx, 'tx_bps': tx, 'rx_pps': rx_packets, 'tx_pps': tx_packets}
+
+        for name, cur in disks.items():
+            old = prev[2].get(name)
+            if old is None:
+                continue
+            deltas = [counter_delta(c, o) for c, o in zip(cur, old)]
+            if None in deltas:
+                continue
+            reads, read_sectors, read_ms, writes, write_sectors, write_ms, busy_ms = deltas
+            ios = reads + writes
+            rates['disks'][name] = {
+                'read_bps': read_sectors * 512 / elapsed,
+                'write_bps': write_sectors * 512 / elapsed,
+                'read_iops': reads / elapsed,
+                'write_iops': writes / elapsed,
+                # average time per request, queueing included
+                'await_ms': (read_ms + write_ms) / ios if ios else 0.0,
+                'util': min(100.0, busy_ms / (elapsed * 10)),
+            }
+        return rates
+
+
+_io_rates = None
+_io_rates_lock = threading.Lock()
+
+
+def get_io_rates():
+    """Per-NIC and per-disk rates since the previous call (see IORates.update)."""
+    global _io_rates
+    try:
+        with _io_rates_lock:
+            if _io_rates is None:
+                _io_rates = IORates()
+            return _io_rates.update()
+    except Exception as e:
+        return {'network': {}, 'disks': {}, 'counters': {'network': {}, 'disks': {}}, 'elapsed': None, 'error': str(e)}
+
+
+class _Proc:
+    __slots__ = ('pid', 'fd', 'stat', 'comm', 'start', 'ticks', 'read_at', 'cpu', 'rss', 'kernel_thread',
+                 'io', 'io_at', 'read_bps', 'write_bps', 'fds', 'user', 'command')
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.fd = self.stat = None
+        self.start = self.ticks = self.read_at = self.cpu = None
+        self.io = self.io_at = self.read_bps = self.write_bps = self.fds = None
+        self.user = self.command = None
+
+
+def _read_io(pid):
+    """(read_bytes, write_bytes) of `pid` from /proc/<pid>/io, None if not allowed."""
+    try:
+        fd = os.open(f'/proc/{pid}/io', os.O_RDONLY)
+        try:
+            data = os.read(fd, 1024)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    # rchar, wchar, syscr, syscw, read_bytes, write_bytes, cancelled_write_bytes
+    fields = data.split()
+    return int(fields[9]), int(fields[11])
+
+
+class ProcessLeaderboard:
+    """Top processes by CPU, memory and disk I/O, refreshed incrementally on every `tick()`.
+
+    /proc/<pid>/stat handles stay open between ticks (up to `max_handles`)
+    and are re-read with pread. A process that used CPU since its last
+    read is read again every tick, an idle one only every `idle_every`
+    ticks (spread by pid), so a tick reads a fraction of all processes;
+    /proc itself is listed for new and exited processes on those rounds
+    too. A stat line identical to the last one is not parsed: the process
+    has used no CPU since. I/O bytes (/proc/<pid>/io) are read for the
+    processes read this tick whose stat changed, that are waiting on disk
+    (state D) or did I/O last time, and for the rest in a sweep of one in
+    `io_sweep` idle rounds: a short write leaves stat unchanged, and a
+    process doing I/O with little CPU must still reach the I/O top. Open
+    fds and the command line are read only for the top entries.
+    Exited processes are dropped and their handles closed.
+    """
+
+    def __init__(self, top_n=None, idle_every=None, max_handles=None, io_sweep=None):
+        self.top_n = top_n or config.LEADERBOARD_TOP_N
+        self.idle_every = idle_every or config.LEADERBOARD_IDLE_EVERY
+        self.io_sweep = io_sweep or config.LEADERBOARD_IO_SWEEP
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        max_handles = max_handles or config.LEADERBOARD_MAX_HANDLES
+        # leave most descriptors to the rest of the program
+        self.max_handles = min(max_handles, soft_limit // 4) if soft_limit > 0 else max_handles
+        self._procs = {}
+        self._hot = set()                                       # read every tick
+        self._idle = [set() for _ in range(self.idle_every)]    # idle pids by slice
+        self._handles = 0
+        self._tick = 0
+        self._rss_top = []
+        self._top = {'cpu': [], 'rss': [], 'io': []}
+        self._lock = threading.Lock()
+        self.last_tick_ms = 0.0
+        self.last_reads = 0
+
+    def _read_stat(self, proc):
+        if proc.fd is not None:
+            try:
+                return os.pread(proc.fd, 4096, 0)
+            except OSError:
+                return None
+        try:
+            fd = os.open(f'/proc/{proc.pid}/stat', os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            os.close(fd)
+            return None
+        if self._handles < self.max_handles:
+            proc.fd = fd
+            self._handles += 1
+        else:
+            os.close(fd)
+        return data
+
+    def _add(self, pid):
+        self._procs[pid] = _Proc(pid)
+        self._hot.add(pid)
+
+    def _drop(self, pid):
+        proc = self._procs.pop(pid)
+        self._hot.discard(pid)
+        self._idle[pid % self.idle_every].discard(pid)
+        if proc.fd is not None:
+            os.close(proc.fd)
+            self._handles -= 1
+
+    def _discover(self):
+        pids = {int(name) for name in os.listdir('/proc') if name.isdigit()}
+        for pid in [p for p in self._procs if p not in pids]:
+            self._drop(pid)
+        for pid in pids:
+            if pid not in self._procs:
+                self._add(pid)
+
+    def tick(self):
+        """Refresh the due processes and the top lists; returns the tick's cost in ms."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        slot = self._tick % self.idle_every
+        io_round = self._tick // self.idle_every % self.io_sweep
+        self._tick += 1
+        full_round = slot == 0
+        if full_round:
+            self._discover()
+
+        read = []
+        io_due = []
+        for pid in list(self._hot) + list(self._idle[slot]):
+            proc = self._procs.get(pid)
+            if proc is None:
+                continue
+            data = self._read_stat(proc)
+            if data is None:
+                self._drop(pid)
+                continue
+            changed = data != proc.stat
+            if not changed:
+                # not a single field moved (most sleepers): no CPU used, nothing to parse
+                proc.cpu, proc.read_at = 0.0, now
+            else:
+                comm, ticks, start, rss, kernel_thread = procs.parse_stat(data)
+                if proc.start is not None and start != proc.start:
+                    # pid reused by a new process
+                    self._drop(pid)
+                    self._add(pid)
+                    proc = self._procs[pid]
+                elif proc.ticks is not None and now > proc.read_at:
+                    proc.cpu = 100.0 * (ticks - proc.ticks) / ((now - proc.read_at) * procs._CLK_TCK)
+                proc.comm, proc.start, proc.ticks, proc.read_at = comm, start, ticks, now
+                proc.rss, proc.kernel_thread, proc.stat = rss, kernel_thread, data
+            # ran, waiting on disk or still doing I/O: every read; the rest in the sweep
+            if (changed or proc.read_bps or proc.write_bps or pid % self.io_sweep == io_round
+                    or data[data.rfind(b')') + 2:][:1] == b'D'):
+                io_due.append(proc)
+            if proc.cpu == 0.0:
+                self._hot.discard(pid)
+                self._idle[pid % self.idle_every].add(pid)
+            else:
+                self._idle[pid % self.idle_every].discard(pid)
+                self._hot.add(pid)
+            read.append(proc)
+
+        # only processes read this tick changed; the rest keep their last rank
+        rss_pool = self._procs.values() if full_round else [p for p in self._rss_top if p.pid in self._procs] + read
+        self._rss_top = heapq.nlargest(2 * self.top_n, set(rss_pool), key=lambda p: p.rss or 0)
+        tops = {
+            'cpu': heapq.nlargest(self.top_n, (self._procs[p] for p in self._hot), key=lambda p: p.cpu or 0.0),
+            'rss': self._rss_top[:self.top_n],
+        }
+        details = {p.pid: p for top in tops.values() for p in top}
+        # like the RSS ranks: the I/O rates of processes not read this tick stand
+        io_pool = dict(details)
+        io_pool.update((p.pid, p) for p in io_due)
+        for entry in self._top['io']:
+            if entry['pid'] in self._procs:
+                io_pool.setdefault(entry['pid'], self._procs[entry['pid']])
+        for proc in io_pool.values():
+            self._update_io(proc, now)
+        tops['io'] = heapq.nlargest(self.top_n, io_pool.values(), key=lambda p: (p.read_bps or 0) + (p.write_bps or 0))
+        details.update((p.pid, p) for p in tops['io'])
+        for proc in details.values():
+            self._read_details(proc)
+        with self._lock:
+            self._top = {by: [self._entry(p) for p in top] for by, top in tops.items()}
+        self.last_reads = len(read)
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        return self.last_tick_ms
+
+    @staticmethod
+    def _update_io(proc, now):
+        """Disk read/write rate since the process' last I/O read."""
+        if proc.kernel_thread:
+            return
+        io = _read_io(proc.pid)
+        if io is not None and proc.io is not None and now > proc.io_at:
+            elapsed = now - proc.io_at
+            proc.read_bps = max(0, io[0] - proc.io[0]) / elapsed
+            proc.write_bps = max(0, io[1] - proc.io[1]) / elapsed
+        proc.io, proc.io_at = io, now
+
+    @staticmethod
+    def _read_details(proc):
+        """Open fds and command line of a top process."""
+        if proc.kernel_thread:
+            return
+        try:
+            # Linux 6.2+ reports the number of open fds as the directory size
+            proc.fds = os.stat(f'/proc/{proc.pid}/fd').st_size or len(os.listdir(f'/proc/{proc.pid}/fd'))
+        except OSError:
+            proc.fds = None
+        if proc.command is None:
+            proc.user, proc.command = procs.owner_and_command(proc.pid, proc.comm)
+
+    @staticmethod
+    def _entry(proc):
+        return {'pid': proc.pid, 'comm': proc.comm, 'user': proc.user, 'command': proc.command,
+                'cpu': round(proc.cpu or 0.0, 1), 'rss': proc.rss, 'read_bps': proc.read_bps,
+                'write_bps': proc.write_bps, 'fds': proc.fds}
+
+    def top(self, by='cpu', n=None):
+        """Top processes by 'cpu' (percent), 'rss' (bytes) or 'io' (bytes/s) as of the last tick."""
+        with self._lock:
+            return list(self._top[by][:n or self.top_n])
+
+    def close(self):
+        for pid in list(self._procs):
+            self._drop(pid)
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """The shared ProcessLeaderboard (ticked by whoever drives it, e.g. the resource sampler)."""
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            _leaderboard = ProcessLeaderboard()
+        return _leaderboard
+
+
 def get_all(disk_path='/'):
     """Return all metrics in a single dict with convenient units.
 
     Memory and disk are annotated with _mb/_gb for display convenience.
     Network is returned with MB converted values as well.
     """
-    try:
-        cpu = get_cpu()
-        mem = get_memory()
-        disk = get_disk(disk_path)
-        net = get_network()
+    return with_units(get_cpu(), get_memory(), get_disk(disk_path), get_network())
 
+
+def with_units(cpu, mem, disk, net):
+    """Assemble the get_all dict from the single getters' results."""
+    try:
         # convert bytes to MB/GB
         def to_mb(b):
             return round(b / (1024.0 ** 2), 2)